@@ -19,7 +19,11 @@ Dov Grobgeld
 Reference:
    - http://www.david-greve.de/luach-code/holidays.html
 """
+import bisect
+import hashlib
 import calendrical
+import condflags
+import parasha
 
 # Enums
 class Pesach:
@@ -69,7 +73,30 @@ def getWeekdayOfHebrewDate(hebYear, hebMonth, hebDay):
   fixed = calendrical.fixedFromHebrew(hebYear, hebMonth, hebDay)
   return calendrical.dayOfWeekFromFixed(fixed)
 
+def getYearType(hebYear):
+  """Get the year type (keviah) of a Hebrew year: the weekday of Rosh
+  Hashana and the length of the year, which also tells whether it is a
+  leap year. There are 14 year types."""
+  info = calendrical.hebrewYearInfo(hebYear)
+  return calendrical.dayOfWeekFromFixed(info.newYear), info.length
+
+_holidayTemplates = {}
+
 def buildHolidays(hebYear,isDiaspora=False):
+  """Get a dictionary of all Jewish holidays of the given year, mapping
+  (month, day) to a list of holidays.
+
+  The holidays only depend on the year type, so the dictionary is built
+  once per year type and shared by all years of that type. It must not
+  be modified."""
+  # Yom Hazikaron is only postponed from Sunday since 5764
+  key = getYearType(hebYear) + (bool(isDiaspora), hebYear >= 5764)
+  holidays = _holidayTemplates.get(key)
+  if holidays is None:
+    holidays = _holidayTemplates[key] = _buildHolidays(hebYear, isDiaspora)
+  return holidays
+
+def _buildHolidays(hebYear,isDiaspora=False):
   """Build a dictionary of all Jewish holidays of the given year"""
   if calendrical._isHebrewLeapYear(hebYear):
     monPurim = 13
@@ -130,7 +157,7 @@ def buildHolidays(hebYear,isDiaspora=False):
     
 
   # Yom Hazikaron and Yom Haatzmaut are complicated
-  WDay_2_4=getWeekdayOfHebrewDate(4, 2, hebYear)
+  WDay_2_4=getWeekdayOfHebrewDate(hebYear, 2, 4)
   if WDay_2_4 == 5: # Thursday
     YZDay=2
   elif WDay_2_4 == 4:
@@ -139,66 +166,253 @@ def buildHolidays(hebYear,isDiaspora=False):
     YZDay=5
   else:
     YZDay=4
-  holidays.update({(2,YZDay): YomHazikaron,
-                   (2,YZDay+1): YomHaatzmaut})
+  holidays.update({(2,YZDay): [YomHazikaron],
+                   (2,YZDay+1): [YomHaatzmaut]})
   
   return holidays
   
 def getJHolidayList(date, isDiaspora=False, isNightFall=False):
-  fixed = calendrical.fixedFromGregorian(date.year, date.month, date.day)
+  """Get the holidays of a datetime.date or calendrical.HDate"""
+  day = calendrical.HDate.fromDate(date)
   if isNightFall:
-    fixed+=1
-  hebDate = calendrical.hebrewFromFixed(fixed)
-  hebYear, hebMonth, hebDay = hebDate
+    day += 1
+  hebYear, hebMonth, hebDay = day.hebrew
 
   holidays = buildHolidays(hebYear,isDiaspora)
   key = (hebMonth,hebDay)
   if key in holidays:
-    return holidays[key]
+    # A copy, as the lists of buildHolidays() are shared
+    return list(holidays[key])
   else:
     return []
 
+# The calendar flags as a table of rules. A rule sets its flag on every
+# day that meets all of its conditions, which are any of
+#   months - Hebrew months
+#   days - days of the month
+#   weekdays - calendrical weekdays
+#   holidays - one of the holidays falls on the day
+#   diaspora - True or False
+#   yearTypes - getYearType() tuples
+# A flag may have several rules, e.g. for the parts of a season.
+FLAGRULES = [
+  ('pesah', {'holidays': [Pesach]}),
+  ('shavuot', {'holidays': [Shavuot]}),
+  ('sukkot', {'holidays': [Sukkot, HoshanaRaba]}),
+  ('shemini', {'holidays': [ShminiAtzeret]}),
+  ('purim', {'holidays': [Purim]}),
+  ('hannuka', {'holidays': [Hannuka]}),
+  ('rosh-hodesh', {'days': [1, 30]}),
+  # From the second day of Pesach to the day before Shavuot
+  ('omer', {'months': [1], 'days': range(16, 31)}),
+  ('omer', {'months': [2]}),
+  ('omer', {'months': [3], 'days': range(1, 6)}),
+  ('LeDavid', {'months': [6]}),
+  ('LeDavid', {'months': [7], 'days': range(1, 22)}),
+  ('tshuva', {'months': [7], 'days': range(1, 10)}),
+  # Mashiv haruach from Shemini Atzeret to the first day of Pesach,
+  # morid hatal in the rest of the year
+  ('horef', {'months': [7], 'days': range(22, 31)}),
+  ('horef', {'months': [8, 9, 10, 11, 12, 13]}),
+  ('horef', {'months': [1], 'days': range(1, 15)}),
+  ('kaitz', {'months': [1], 'days': range(15, 31)}),
+  ('kaitz', {'months': [2, 3, 4, 5, 6]}),
+  ('kaitz', {'months': [7], 'days': range(1, 22)}),
+  ]
+
+def _compileRules(rules):
+  """Compile rules into a list of (bit, months, days, weekdays, holidays,
+  diaspora, yearTypes), with the conditions as sets and None for no
+  condition"""
+  def condition(conditions, name):
+    if name not in conditions:
+      return None
+    return frozenset(conditions[name])
+  compiled = []
+  for flag, conditions in rules:
+    compiled.append((condflags.flagBit(flag),
+                     condition(conditions, 'months'),
+                     condition(conditions, 'days'),
+                     condition(conditions, 'weekdays'),
+                     condition(conditions, 'holidays'),
+                     conditions.get('diaspora'),
+                     condition(conditions, 'yearTypes')))
+  return compiled
+
+_flagRules = _compileRules(FLAGRULES)
+
+PARASHA = [condflags.flagBit('parasha-' + name) for name in parasha.PARSHIYOT]
+
+def rulesHash():
+  """An md5 digest of FLAGRULES and of the weekly portions, for telling
+  whether flags computed earlier are still those of the rules"""
+  rules = []
+  for flag, conditions in FLAGRULES:
+    items = []
+    for name in sorted(conditions):
+      value = conditions[name]
+      if name == 'holidays':
+        value = sorted([holiday.__name__ for holiday in value])
+      elif name != 'diaspora':
+        value = sorted(value)
+      items.append((name, value))
+    rules.append((flag, items))
+  return hashlib.md5(repr((rules, parasha.PARSHIYOT))).digest()
+
+def _buildFlagTemplate(hebYear, isDiaspora):
+  """Evaluate the flag rules for every day of a year, in a single pass.
+  Returns the list of the masks by day of the year, without the weekly
+  portion."""
+  info = calendrical.hebrewYearInfo(hebYear)
+  holidays = buildHolidays(hebYear, isDiaspora)
+  yearType = getYearType(hebYear)
+  rules = [rule[:5] for rule in _flagRules
+           if ((rule[5] is None or rule[5] == bool(isDiaspora))
+               and (rule[6] is None or yearType in rule[6]))]
+  masks = []
+  weekday = calendrical.dayOfWeekFromFixed(info.newYear)
+  for hebMonth in info.months:
+    monthRules = [rule for rule in rules if rule[1] is None or hebMonth in rule[1]]
+    for hebDay in range(1, info.monthLengths[hebMonth] + 1):
+      dayHolidays = holidays.get((hebMonth, hebDay), [])
+      mask = 0
+      for bit, months, days, weekdays, anyHolidays in monthRules:
+        if ((days is None or hebDay in days)
+            and (weekdays is None or weekday in weekdays)
+            and (anyHolidays is None or anyHolidays.intersection(dayHolidays))):
+          mask |= bit
+      masks.append(mask)
+      weekday = (weekday + 1) % 7
+  return masks
+
+_flagTemplates = {}
+
+def _getFlagTemplate(hebYear, isDiaspora):
+  """The masks of _buildFlagTemplate(), shared by the years with the
+  same holidays as in buildHolidays()"""
+  key = getYearType(hebYear) + (bool(isDiaspora), hebYear >= 5764)
+  template = _flagTemplates.get(key)
+  if template is None:
+    template = _flagTemplates[key] = _buildFlagTemplate(hebYear, isDiaspora)
+  return template
+
 def getCalendarFlags(date, isDiaspora, isNightFall):
-    """Get a regexp match for the date"""
-    holidays = getJHolidayList(date, isDiaspora, isNightFall)
-
-    flags = []
-    if Pesach in holidays:
-      flags += ['pesah']
-    elif Shavuot in holidays:
-      flags += ['shavuot']
-    elif ShminiAtzeret in holidays:
-      flags += ['shemini']
-    elif Purim in holidays:
-      flags += ['purim']
-    elif Hannuka in holidays:
-      flags += ['hanukka']
-
-    # Check for rosh chodesh
-    fixed = calendrical.fixedFromGregorian(date.year, date.month, date.day)
-    hebrew_date = calendrical.hebrewFromFixed(fixed)
-    hebYear, hebMonth, hebDay = hebrew_date[0], hebrew_date[1], hebrew_date[2]
-    if hebDay == 1 or hebDay == 30:
-      flags += ['rosh-hodesh']
-
-    # Other flags. TBD - Add more
-
-    # Omer
-    if ((hebMonth == 1 and hebDay>15) 
-        or hebMonth == 2
-        or (hebMonth == 3 and hebDay < 6)):
-        flags += ['Omer']
-
-    # LeDavid
-    if (hebMonth == 6
-        or (hebMonth == 7 and hebDay < 22)):
-        flags += ['LeDavid']
-
-    # tshuva
-    if (hebMonth == 7 and hebDay < 10):
-        flags += ['tshuva']
-
-    return "|".join(flags)
+    """Get the flags of the date as a condflags.DayContext. After
+    nightfall all flags are those of the next day."""
+    day = calendrical.HDate.fromDate(date)
+    if isNightFall:
+      day += 1
+    return condflags.DayContext(_getFlags(day, isDiaspora))
+
+def _getFlags(day, isDiaspora):
+    """The flag mask of a calendrical.HDate"""
+    info = calendrical.hebrewYearInfo(day.hebrew[0])
+    return (_getFlagTemplate(info.year, isDiaspora)[day.fixed - info.newYear]
+            | _getParashaFlags(day, isDiaspora))
+
+def _getParashaFlags(day, isDiaspora):
+    """The flag mask of the weekly Torah portion, e.g. parasha-bereshit"""
+    flags = 0
+    for p in parasha.getParashaIndices(day, isDiaspora):
+        flags |= PARASHA[p]
+    return flags
+
+def getYearFlags(hebYear, isDiaspora=False):
+  """Get the flag masks of every day of a Hebrew year, followed by the
+  mask of the first day of the next year, in a single sweep over the
+  year. The mask after nightfall of a day is the one that follows it."""
+  info = calendrical.hebrewYearInfo(hebYear)
+  masks = list(_getFlagTemplate(hebYear, isDiaspora))
+  fixed = info.newYear
+  weekday = calendrical.dayOfWeekFromFixed(fixed)
+  parashaFlags = _getParashaFlags(calendrical.HDate(fixed), isDiaspora)
+  for i in range(len(masks)):
+    if weekday == calendrical.SUNDAY:
+      parashaFlags = _getParashaFlags(calendrical.HDate(fixed + i), isDiaspora)
+    masks[i] |= parashaFlags
+    weekday = (weekday + 1) % 7
+  masks.append(_getFlags(calendrical.HDate(fixed + len(masks)), isDiaspora))
+  return masks
+
+def getMonthGrid(year, month, isDiaspora=False, isHebrew=False):
+  """Get every day of a Gregorian month, or a Hebrew month if isHebrew
+  is set, as a list of (calendrical.HDate, holiday list,
+  condflags.DayContext). The
+  dates and holiday tables are computed once for the whole month."""
+  if isHebrew:
+    start = calendrical.fixedFromHebrew(year, month, 1)
+    end = start + calendrical._lastDayOfHebrewMonth(year, month)
+  else:
+    start = calendrical.fixedFromGregorian(year, month, 1)
+    end = start + calendrical._lastDayOfGregorianMonth(year, month)
+
+  grid = []
+  tables = {}
+  for fixed, gregorian, hebrew, weekday in calendrical.daysFromFixed(start, end):
+    day = calendrical.HDate(fixed, tuple(gregorian), tuple(hebrew))
+    hebYear, hebMonth, hebDay = hebrew
+    if hebYear not in tables:
+      tables[hebYear] = buildHolidays(hebYear, isDiaspora)
+    holidays = list(tables[hebYear].get((hebMonth, hebDay), []))
+    grid.append((day, holidays, condflags.DayContext(_getFlags(day, isDiaspora))))
+  return grid
+
+_holidayIndexCache = calendrical._LRUCache(64)
+
+def _getHolidayIndex(hebYear, isDiaspora):
+  """Map each holiday of a Hebrew year to the sorted list of the fixed
+  day numbers on which it falls"""
+  key = (hebYear, bool(isDiaspora))
+  index = _holidayIndexCache.get(key)
+  if index is None:
+    index = {}
+    for (hebMonth, hebDay), holidays in buildHolidays(hebYear, isDiaspora).items():
+      fixed = calendrical.fixedFromHebrew(hebYear, hebMonth, hebDay)
+      for holiday in holidays:
+        index.setdefault(holiday, []).append(fixed)
+    for days in index.values():
+      days.sort()
+    _holidayIndexCache.put(key, index)
+  return index
+
+def occurrences(holiday, start, end, isDiaspora=False):
+  """Get the days in [start, end) on which holiday falls, e.g. all days
+  of Pesach, as a list of datetime.date. start and end may be
+  datetime.date or calendrical.HDate."""
+  start = calendrical.HDate.fromDate(start)
+  end = calendrical.HDate.fromDate(end)
+  days = []
+  if start >= end:
+    return days
+  for hebYear in range(start.hebrew[0], (end - 1).hebrew[0] + 1):
+    yearDays = _getHolidayIndex(hebYear, isDiaspora).get(holiday, [])
+    days += yearDays[bisect.bisect_left(yearDays, start.fixed):
+                     bisect.bisect_left(yearDays, end.fixed)]
+  return [calendrical.HDate(d).toDate() for d in days]
+
+def nextOccurrence(holiday, date, isDiaspora=False):
+  """Get the first day on or after date on which holiday falls, as a
+  datetime.date, or None if it does not fall within the next year."""
+  day = calendrical.HDate.fromDate(date)
+  hebYear = day.hebrew[0]
+  for y in (hebYear, hebYear + 1):
+    yearDays = _getHolidayIndex(y, isDiaspora).get(holiday, [])
+    i = bisect.bisect_left(yearDays, day.fixed)
+    if i < len(yearDays):
+      return calendrical.HDate(yearDays[i]).toDate()
+  return None
+
+def previousOccurrence(holiday, date, isDiaspora=False):
+  """Get the last day before date on which holiday falls, as a
+  datetime.date, or None if it did not fall within the last year."""
+  day = calendrical.HDate.fromDate(date)
+  hebYear = day.hebrew[0]
+  for y in (hebYear, hebYear - 1):
+    yearDays = _getHolidayIndex(y, isDiaspora).get(holiday, [])
+    i = bisect.bisect_left(yearDays, day.fixed)
+    if i > 0:
+      return calendrical.HDate(yearDays[i-1]).toDate()
+  return None
 
 if __name__=='__main__':
   import datetime
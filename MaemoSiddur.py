@@ -18,6 +18,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 __author__	= "Dov Grobgeld <dov.grobgeld@gmail.com>"
 
 import gtk, gobject, sys
+import time
 import datetime
 from condhtmltextview import *
 
@@ -28,6 +29,8 @@ try:
 except:
     use_hildon=False
 import JHolidays
+import flagtable
+import zmanim
 
 prayers = [(u'שחרית','shacharit.html'),
            (u'ברכת המזון','birkat.html'),
@@ -37,15 +40,101 @@ prayers = [(u'שחרית','shacharit.html'),
            ]
 
 
-def load_prayer(prayer_num):
-    txt = open(prayers[prayer_num][1]).read()
-    tv.display_html("""
+prayer_template = """
     <body xmlns='http://www.w3.org/1999/xhtml'>
     <span style="font-family:Frank Ruehl CLM; font-size: +150%%">%s
     </span>
     </body>
-    """%txt)
+    """
 
+def load_prayer(prayer_num):
+    tv.display_file(prayers[prayer_num][1], prayer_template)
+
+def on_render_progress(view, fraction):
+    """Show that the prayer is still loading"""
+    if use_hildon:
+        hildon.hildon_gtk_window_set_progress_indicator(w, fraction < 1.0)
+    elif fraction < 1.0:
+        progress.set_fraction(fraction)
+        progress.show()
+    else:
+        progress.hide()
+
+
+def choose_date(date):
+    """Let the user choose a date from a calendar with the holidays
+    marked. Returns the chosen datetime.date, or date if cancelled."""
+    dialog = gtk.Dialog(u"בחירת תאריך", w,
+                        gtk.DIALOG_MODAL,
+                        (gtk.STOCK_CANCEL, gtk.RESPONSE_CANCEL,
+                         gtk.STOCK_OK, gtk.RESPONSE_OK))
+    calendar = gtk.Calendar()
+    calendar.select_month(date.month-1, date.year)
+    calendar.select_day(date.day)
+    label = gtk.Label()
+    dialog.vbox.pack_start(calendar, True, True, 0)
+    dialog.vbox.pack_start(label, False, False, 0)
+
+    # Whole month grids, so that scrolling back and forth between months
+    # never recomputes a month.
+    grids = {}
+    def get_grid(year, month):
+        if not (year, month) in grids:
+            grids[(year, month)] = JHolidays.getMonthGrid(year, month, isDiaspora)
+        return grids[(year, month)]
+
+    def on_month_changed(calendar):
+        year, month, day = calendar.get_date()
+        calendar.freeze()
+        calendar.clear_marks()
+        for hdate, holidays, flags in get_grid(year, month+1):
+            if holidays:
+                calendar.mark_day(hdate.gregorian[2])
+        calendar.thaw()
+
+    def on_day_selected(calendar):
+        year, month, day = calendar.get_date()
+        grid = get_grid(year, month+1)
+        if day < 1 or day > len(grid):
+            return
+        hdate, holidays, flags = grid[day-1]
+        text = "%d/%d/%d" % tuple(reversed(hdate.hebrew))
+        if holidays:
+            text += " " + ", ".join([h.__name__ for h in holidays])
+        label.set_text(text)
+
+    calendar.connect("month-changed", on_month_changed)
+    calendar.connect("day-selected", on_day_selected)
+    on_month_changed(calendar)
+    on_day_selected(calendar)
+    dialog.show_all()
+    if dialog.run() == gtk.RESPONSE_OK:
+        year, month, day = calendar.get_date()
+        date = datetime.date(year, month+1, day)
+    dialog.destroy()
+    return date
+
+def set_date_flags(date, isNightFall):
+    flags = None
+    if flagTable:
+        flags = flagTable.getFlags(date, isDiaspora, isNightFall)
+    if flags is None:
+        flags = JHolidays.getCalendarFlags(date, isDiaspora, isNightFall)
+    tv.set_flags(flags)
+
+def schedule_flags_update():
+    """Update the flags of today at the next nightfall or midnight"""
+    delay = zmanim.getNextTransition(latitude, longitude) - time.time()
+    gobject.timeout_add_seconds(max(int(delay) + 1, 1), on_flags_timeout)
+
+def on_flags_timeout():
+    global isNightFall
+    isNightFall = zmanim.isNightFall(latitude, longitude)
+    # The flags of a date chosen by the user do not change by themselves
+    if follow_today:
+        set_date_flags(datetime.date.today(), isNightFall)
+    schedule_flags_update()
+    return False
     
 # The following code is taken from
 #   http://libre2.adacore.com/viewvc/trunk/gps/share/plug-ins/text_utils.py?view=markup&pathrev=131464
@@ -94,17 +183,29 @@ w.add(v)
 
 tv = CondHtmlTextView()
 isDiaspora = False
-isNightFall = False
-calender_flags = JHolidays.getCalendarFlags(datetime.datetime.today(),isDiaspora,isNightFall)
-tv.set_flag(calender_flags)
+# Location for the sunset calculation, Jerusalem
+latitude = 31.78
+longitude = 35.22
+isNightFall = zmanim.isNightFall(latitude, longitude)
+# Precomputed flags, see flagtable.py. Dates outside of the table are
+# computed by JHolidays.
+flagTable = flagtable.loadTable() or flagtable.openTable()
+set_date_flags(datetime.date.today(), isNightFall)
+follow_today = True
+schedule_flags_update()
 tv.set_wrap_mode(gtk.WRAP_WORD)
 tv.set_cursor_visible(False)
 tv.connect("button-press-event", on_button_press)
+tv.connect("render-progress", on_render_progress)
 override_key_bindings(select=False)
 v.pack_start(pa, True, True, 0)
 pa.add(tv)
+progress = gtk.ProgressBar()
+if not use_hildon:
+    v.pack_start(progress, False, False, 0)
 
 w.show_all()
+progress.hide()
 tv.grab_focus()
 
 # Try using hardkeys, but ignore on failure
@@ -119,9 +220,17 @@ if use_hildon:
     FremantleRotation('MaemoSiddurDialog', dialog, '1.0', FremantleRotation.AUTOMATIC)
 for i in range(len(prayers)):
     dialog.add_button(prayers[i][0],i)
+DATE_RESPONSE = len(prayers)
+dialog.add_button(u'תאריך', DATE_RESPONSE)
 dialog.set_title(u"נא לבחור תפילה")
 dialog.show_all()
+date = datetime.date.today()
 prayer_choice = dialog.run()
+while prayer_choice == DATE_RESPONSE:
+    date = choose_date(date)
+    follow_today = date == datetime.date.today()
+    set_date_flags(date, follow_today and isNightFall)
+    prayer_choice = dialog.run()
 
 if prayer_choice>=0:
     load_prayer(prayer_choice)
@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# -*- Encoding: utf-8 -*-
+
+"""
+Benchmarks of the calendrical and JHolidays hot paths.
+
+Run by doing
+
+    python benchmark.py [-o results.json] [-b baseline.json] [-t 0.1]
+
+Each benchmark calls a function over a realistic range of arguments and
+reports the number of calls per second and percentiles of the per call
+latency. Every call is timed on its own, less the overhead of the
+timer. The -cold benchmarks clear the year type caches of JHolidays
+before every call, so that they measure building the tables.
+
+The results may be written as JSON and compared against the JSON
+results of an earlier run, in which case the exit status is 1 if any
+benchmark got slower than the baseline by more than the threshold.
+"""
+
+import sys
+import datetime
+import optparse
+from timeit import default_timer as timer
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import calendrical
+import JHolidays
+
+def _fixedRange():
+    """Every day of the Gregorian years 2000-2029"""
+    return range(calendrical.fixedFromGregorian(2000, 1, 1),
+                 calendrical.fixedFromGregorian(2030, 1, 1))
+
+# The arguments of the benchmarks, built only for those that are run
+
+def _fixedArgs():
+    return [(d,) for d in _fixedRange()]
+
+def _gregorianArgs():
+    return [tuple(calendrical.gregorianFromFixed(d)) for d in _fixedRange()]
+
+def _hebrewArgs():
+    return [tuple(calendrical.hebrewFromFixed(d)) for d in _fixedRange()]
+
+def _dateArgs():
+    return [(datetime.date(*g), False, False) for g in _gregorianArgs()]
+
+def _yearArgs():
+    return [(y, diaspora) for y in range(5700, 5800) for diaspora in (False, True)]
+
+def _clearTemplates():
+    JHolidays._holidayTemplates.clear()
+    JHolidays._flagTemplates.clear()
+
+def benchmarks():
+    """List of (name, function, function returning the list of argument
+    tuples, setup). setup is None or a function that is called, untimed,
+    before every call."""
+    return [
+        ('fixedFromGregorian', calendrical.fixedFromGregorian, _gregorianArgs, None),
+        ('gregorianFromFixed', calendrical.gregorianFromFixed, _fixedArgs, None),
+        ('fixedFromHebrew', calendrical.fixedFromHebrew, _hebrewArgs, None),
+        ('hebrewFromFixed', calendrical.hebrewFromFixed, _fixedArgs, None),
+        ('isoFromFixed', calendrical.isoFromFixed, _fixedArgs, None),
+        ('buildHolidays', JHolidays.buildHolidays, _yearArgs, None),
+        ('buildHolidays-cold', JHolidays.buildHolidays, _yearArgs, _clearTemplates),
+        ('getCalendarFlags', JHolidays.getCalendarFlags, _dateArgs, None),
+        ('getYearFlags', JHolidays.getYearFlags, _yearArgs, None),
+        ('getYearFlags-cold', JHolidays.getYearFlags, _yearArgs, _clearTemplates),
+        ]
+
+def _percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p*len(sorted_values)))]
+
+def timerOverhead(samples=10000):
+    """The median time between two consecutive timer calls"""
+    times = []
+    for i in range(samples):
+        t0 = timer()
+        times.append(timer() - t0)
+    times.sort()
+    return _percentile(times, 0.50)
+
+def run(func, args, repeat=3, setup=None, overhead=None):
+    """Time every call of func over args, repeat times, and summarize
+    the latencies"""
+    if overhead is None:
+        overhead = timerOverhead()
+    latencies = []
+    for r in range(repeat):
+        for a in args:
+            if setup is not None:
+                setup()
+            t0 = timer()
+            func(*a)
+            t = timer() - t0
+            latencies.append(max(t - overhead, 0.0))
+    calls = len(latencies)
+    total = max(sum(latencies), 1e-9)
+    latencies.sort()
+    return {'calls': calls,
+            'ops_per_sec': calls/total,
+            'p50_us': 1e6*_percentile(latencies, 0.50),
+            'p90_us': 1e6*_percentile(latencies, 0.90),
+            'p99_us': 1e6*_percentile(latencies, 0.99),
+            }
+
+def compare(results, baseline, threshold):
+    """Names of the benchmarks that regressed more than threshold"""
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        if results[name]['ops_per_sec'] < baseline[name]['ops_per_sec']*(1 - threshold):
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] [benchmark ...]")
+    parser.add_option('-o', '--output', help="write the results as JSON to FILE",
+                      metavar="FILE")
+    parser.add_option('-b', '--baseline', help="compare against the JSON results in FILE",
+                      metavar="FILE")
+    parser.add_option('-t', '--threshold', type='float', default=0.1,
+                      help="allowed slowdown relative to the baseline [default: %default]")
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help="number of passes over the arguments [default: %default]")
+    options, names = parser.parse_args()
+
+    baseline = {}
+    if options.baseline:
+        baseline = json.load(open(options.baseline))
+
+    results = {}
+    overhead = timerOverhead()
+    print "%-20s %12s %10s %10s %10s %10s" % (
+        'benchmark', 'ops/sec', 'p50 us', 'p90 us', 'p99 us', 'baseline')
+    for name, func, args, setup in benchmarks():
+        if names and name not in names:
+            continue
+        r = results[name] = run(func, args(), options.repeat, setup, overhead)
+        if name in baseline:
+            change = "%+.1f%%" % (100.0*(r['ops_per_sec']/baseline[name]['ops_per_sec'] - 1))
+        else:
+            change = '-'
+        print "%-20s %12.0f %10.2f %10.2f %10.2f %10s" % (
+            name, r['ops_per_sec'], r['p50_us'], r['p90_us'], r['p99_us'], change)
+
+    if options.output:
+        f = open(options.output, 'w')
+        try:
+            json.dump(results, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    regressions = compare(results, baseline, options.threshold)
+    if regressions:
+        print "Regressions beyond %.0f%%: %s" % (100*options.threshold, ", ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
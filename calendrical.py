@@ -17,6 +17,9 @@ in the module have similar names to the names used in the book.
 All calculations are done to or from a fixed day number series. Day 
 number 1 is Monday, January 1, 1 (Gregorian calendar).
 
+All conversions use integer arithmetic only (floor division instead of
+math.floor() on floats), so results are exact for any date range.
+
 Examples:
 Find the Hebrew date for February 25, 2007:
 >>> hebrewFromFixed(fixedFromGregorian(2007, FEBRUARY, 25))
@@ -36,8 +39,15 @@ E.M. Reingold and N. Dershowitz, Errata and Notes for Calendrical
 """
 __author__	= "Jacob Tardell <python@tardell.se>"
 
-import math
+import os
+import mmap
+import bisect
+import struct
 import operator
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 def _amod(x, y):
 	"""
@@ -52,6 +62,70 @@ def _amod(x, y):
 	"""
 	return y + x % (-y)
 
+class _LRUCache(object):
+	"""
+	Bounded mapping that forgets the least recently used entry.
+	
+	Argument:
+	size - maximum number of entries kept
+	"""
+	def __init__(self, size):
+		self.size = size
+		self.clear()
+
+	def clear(self):
+		"""
+		Forget all entries.
+		"""
+		self.data = {}
+		# Circular doubly linked list of [prev, next, key] links, the
+		# most recently used entry right before the root.
+		self.root = root = []
+		root[:] = [root, root, None]
+
+	def get(self, key):
+		"""
+		Look up key.
+		
+		Argument:
+		key - hashable key
+		
+		Return value:
+		the cached value or None
+		"""
+		try:
+			link, value = self.data[key]
+		except KeyError:
+			return None
+		prev, next, _ = link
+		prev[1] = next
+		next[0] = prev
+		root = self.root
+		last = root[0]
+		last[1] = root[0] = link
+		link[0] = last
+		link[1] = root
+		return value
+
+	def put(self, key, value):
+		"""
+		Store value under key, evicting the oldest entry if full.
+		
+		Arguments:
+		key - hashable key
+		value - value to cache
+		"""
+		root = self.root
+		if len(self.data) >= self.size:
+			oldest = root[1]
+			root[1] = oldest[1]
+			oldest[1][0] = root
+			del self.data[oldest[2]]
+		last = root[0]
+		link = [last, root, key]
+		last[1] = root[0] = link
+		self.data[key] = (link, value)
+
 # Cycles of Days
 SUNDAY = 0
 MONDAY = SUNDAY + 1
@@ -219,6 +293,26 @@ def _isGregorianLeapYear(year):
 	"""
 	return (year % 4) == 0 and not ((year % 400) in [100, 200, 300])
 
+def _lastDayOfGregorianMonth(year, month):
+	"""
+	Number of days in a Gregorian month.
+	
+	Arguments:
+	year - Gregorian year
+	month - Gregorian month
+	
+	Return value:
+	[28..31]
+	"""
+	if month == FEBRUARY:
+		if _isGregorianLeapYear(year):
+			return 29
+		return 28
+	elif month in [APRIL, JUNE, SEPTEMBER, NOVEMBER]:
+		return 30
+	else:
+		return 31
+
 def fixedFromGregorian(year, month, day):
 	"""
 	Convert Gregorian date to fixed day number.
@@ -239,8 +333,8 @@ def fixedFromGregorian(year, month, day):
 	732877
 	"""
 	m = _amod((month - 2), 12)
-	y = year + math.floor((month + 9)/12)
-	return int(GREGORIANEPOCH - 1 - 306 + 365 *(y - 1) + math.floor((y - 1)/4) - math.floor((y - 1)/100) + math.floor((y - 1)/400) + math.floor((3*m - 1)/5) + 30*(m - 1) + day)
+	y = year + (month + 9)//12
+	return GREGORIANEPOCH - 1 - 306 + 365*(y - 1) + (y - 1)//4 - (y - 1)//100 + (y - 1)//400 + (3*m - 1)//5 + 30*(m - 1) + day
 
 def gregorianYearFromFixed(date):
 	"""
@@ -273,12 +367,12 @@ def gregorianYearFromFixed(date):
 
 	Passover is on a Thursday (4). So Passover starts on a Wednesday evening.
 	"""
-	approx = math.floor((date - GREGORIANEPOCH + 2) * 400 / 146097)
-	start = GREGORIANEPOCH + 365 * approx + math.floor(approx/4) - math.floor(approx/100) + math.floor(approx/400)
+	approx = (date - GREGORIANEPOCH + 2)*400//146097
+	start = GREGORIANEPOCH + 365*approx + approx//4 - approx//100 + approx//400
 	if date < start:
-		return int(approx)
+		return approx
 	else:
-		return int(approx + 1)
+		return approx + 1
 
 def gregorianFromFixed(date):
 	"""
@@ -296,9 +390,9 @@ def gregorianFromFixed(date):
 	"""
 	y = gregorianYearFromFixed(GREGORIANEPOCH - 1 + date + 306)
 	priorDays = date - fixedFromGregorian(y - 1, 3, 1)
-	month = int(_amod(math.floor((5*priorDays + 155)/153) + 2, 12))
-	year = int(y - math.floor((month + 9)/12))
-	day = int(date - fixedFromGregorian(year, month, 1) + 1)
+	month = _amod((5*priorDays + 155)//153 + 2, 12)
+	year = y - (month + 9)//12
+	day = date - fixedFromGregorian(year, month, 1) + 1
 	return [year, month, day]
 
 # ISO
@@ -349,7 +443,7 @@ def isoFromFixed(date):
 		year = approx + 1
 	else:
 		year = approx
-	week = int(math.floor((date - fixedFromIso(year, 1, 1))/7) + 1)
+	week = (date - fixedFromIso(year, 1, 1))//7 + 1
 	day = _amod(date, 7)
 	return [year, week, day]
 
@@ -398,25 +492,41 @@ def _lastMonthOfHebrewYear(year):
 	else:
 		return 12
 
-def _molad(month, year):
+# Parts (chalakim) of an hour, a day and a mean lunar month
+HOURPARTS = 1080
+DAYPARTS = 24*HOURPARTS
+MONTHPARTS = 29*DAYPARTS + 13753
+
+def _moladParts(month, year):
 	"""
-	The fixed moment of the mean conjunction
-	
-	Bug, see note 158 in Errata.
+	The moment of the mean conjunction in parts.
 	
 	Arguments:
 	year - Hebrew year
 	month - Hebrew month
 	
 	Return value:
-	number (FIXME - should be integer?)
+	integer - parts since midnight starting fixed day 0
 	"""
 	if month < TISHRI:
 		y = year + 1
 	else:
 		y = year
-	monthsElapsed = month - tischri + int(math.floor((235*y - 234)/19.0))
-	return HEBREWEPOCH - (876.0/25920) + monthsElapsed*(29 + 0.5 + (793.0/25920))
+	monthsElapsed = month - TISHRI + (235*y - 234)//19
+	return HEBREWEPOCH*DAYPARTS - 876 + monthsElapsed*MONTHPARTS
+
+def _molad(month, year):
+	"""
+	The fixed moment of the mean conjunction
+	
+	Arguments:
+	year - Hebrew year
+	month - Hebrew month
+	
+	Return value:
+	number - fixed day number with the time of day as fraction
+	"""
+	return _moladParts(month, year)/float(DAYPARTS)
 
 def _hebrewCalendarElapsedDays(year):
 	"""
@@ -428,9 +538,9 @@ def _hebrewCalendarElapsedDays(year):
 	Return value:
 	integer - days
 	"""
-	monthsElapsed = int(math.floor((235*year - 234)/19.0))
+	monthsElapsed = (235*year - 234)//19
 	partsElapsed = 12084 + 13753*monthsElapsed
-	day = 29 * monthsElapsed + int(math.floor(partsElapsed/25920.0))
+	day = 29*monthsElapsed + partsElapsed//25920
 	if (3*(day + 1) % 7) < 3:
 		return day + 1
 	else:
@@ -446,9 +556,15 @@ def _hebrewNewYearDelay(year):
 	Return value:
 	[0, 1, 2]
 	"""
-	ny0 = _hebrewCalendarElapsedDays(year - 1)
-	ny1 = _hebrewCalendarElapsedDays(year)
-	ny2 = _hebrewCalendarElapsedDays(year + 1)
+	return _newYearDelay(_hebrewCalendarElapsedDays(year - 1),
+	                     _hebrewCalendarElapsedDays(year),
+	                     _hebrewCalendarElapsedDays(year + 1))
+
+def _newYearDelay(ny0, ny1, ny2):
+	"""
+	New Year delay from the elapsed days of the year before, the year
+	and the year after, see _hebrewNewYearDelay().
+	"""
 	if (ny2 - ny1) == 356:
 		return 2
 	elif (ny1 - ny0) == 382:
@@ -456,6 +572,146 @@ def _hebrewNewYearDelay(year):
 	else:
 		return 0
 
+def _arithmeticHebrewNewYears(year):
+	"""
+	Fixed day numbers of the New Year of a Hebrew year and the next.
+	
+	Argument:
+	year - Hebrew year
+	
+	Return value:
+	(integer, integer) - fixed day numbers
+	"""
+	ny0, ny1, ny2, ny3 = [_hebrewCalendarElapsedDays(y) for y in range(year - 1, year + 3)]
+	return (HEBREWEPOCH + ny1 + _newYearDelay(ny0, ny1, ny2),
+	        HEBREWEPOCH + ny2 + _newYearDelay(ny1, ny2, ny3))
+
+# The Hebrew year table is a file of little endian 32 bit integers: the
+# magic number YEARTABLEMAGIC, the first year and the number of years in
+# the table, followed by the fixed day number of the New Year of each of
+# these years and of the year after the last one. The year length is the
+# difference of two consecutive entries. It is generated by
+# mkhebrewyears.py and mapped read only, so that it is shared between
+# processes.
+YEARTABLEMAGIC = 0x31545948
+YEARTABLEFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hebrewyears.dat')
+
+def _openYearTable(filename):
+	"""
+	Map a Hebrew year table into memory.
+	
+	Argument:
+	filename - table file
+	
+	Return value:
+	(mmap, first year, number of years) or None if the file is missing
+	or not a year table
+	"""
+	try:
+		f = open(filename, 'rb')
+		try:
+			table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		finally:
+			f.close()
+	except (IOError, OSError, ValueError, mmap.error):
+		return None
+	if len(table) < 12:
+		return None
+	magic, first, count = struct.unpack_from('<iii', table, 0)
+	if magic != YEARTABLEMAGIC or len(table) < 4*(count + 4):
+		return None
+	return table, first, count
+
+_yearTable = _openYearTable(YEARTABLEFILE)
+
+def _hebrewNewYears(year):
+	"""
+	Fixed day numbers of the New Year of a Hebrew year and the next,
+	from the year table when it covers the year.
+	
+	Argument:
+	year - Hebrew year
+	
+	Return value:
+	(integer, integer) - fixed day numbers
+	"""
+	if _yearTable is not None:
+		table, first, count = _yearTable
+		if first <= year < first + count:
+			return struct.unpack_from('<ii', table, 4*(year - first + 3))
+	return _arithmeticHebrewNewYears(year)
+
+class HebrewYearInfo(object):
+	"""
+	Calendar metadata of a single Hebrew year.
+	
+	Use hebrewYearInfo() to get a cached instance.
+	
+	Attributes:
+	year - Hebrew year
+	newYear - fixed day number of Tishri 1
+	length - number of days in the year
+	isLeap - True if the year has 13 months
+	monthLengths - number of days per month, indexed by Hebrew month
+	monthStarts - offset in days of the first of each month from newYear,
+		indexed by Hebrew month
+	months - the Hebrew months in calendar order, starting with TISHRI
+	monthOffsets - monthStarts of months, in ascending order
+	
+	Example:
+	>>> info = hebrewYearInfo(5772)
+	>>> info.newYear, info.length, info.isLeap
+	(734409, 354, False)
+	"""
+	__slots__ = ('year', 'newYear', 'length', 'isLeap', 'monthLengths',
+	             'monthStarts', 'months', 'monthOffsets')
+
+	def __init__(self, year):
+		newYear, nextNewYear = _hebrewNewYears(year)
+		self.year = year
+		self.newYear = newYear
+		self.length = nextNewYear - newYear
+		self.isLeap = _isHebrewLeapYear(year)
+
+		lengths = [0, 30, 29, 30, 29, 30, 29, 30, 29, 30, 29, 30, 30, 29]
+		if not self.isLeap:
+			lengths[ADAR] = 29
+		if self.length in [355, 385]:
+			lengths[MARHESHVAN] = 30
+		if self.length in [353, 383]:
+			lengths[KISLEV] = 29
+		self.monthLengths = tuple(lengths)
+
+		self.months = tuple(range(TISHRI, _lastMonthOfHebrewYear(year) + 1) + range(NISAN, TISHRI))
+		starts = [0] * 14
+		offset = 0
+		for m in self.months:
+			starts[m] = offset
+			offset += lengths[m]
+		self.monthOffsets = tuple([starts[m] for m in self.months])
+		if not self.isLeap:
+			# As in fixedFromHebrew(), a non existing ADARII starts with NISAN.
+			starts[ADARII] = starts[NISAN]
+		self.monthStarts = tuple(starts)
+
+_hebrewYearInfoCache = _LRUCache(256)
+
+def hebrewYearInfo(year):
+	"""
+	Cached calendar metadata of a Hebrew year.
+	
+	Argument:
+	year - Hebrew year
+	
+	Return value:
+	HebrewYearInfo
+	"""
+	info = _hebrewYearInfoCache.get(year)
+	if info is None:
+		info = HebrewYearInfo(year)
+		_hebrewYearInfoCache.put(year, info)
+	return info
+
 def _hebrewNewYear(year):
 	"""
 	Fixed day number for Hebrew New Year.
@@ -466,7 +722,7 @@ def _hebrewNewYear(year):
 	Return value:
 	integer - fixed day number
 	"""
-	return HEBREWEPOCH + _hebrewCalendarElapsedDays(year) + _hebrewNewYearDelay(year)
+	return hebrewYearInfo(year).newYear
 
 def _daysInHebrewYear(year):
 	"""
@@ -478,7 +734,7 @@ def _daysInHebrewYear(year):
 	Return value:
 	integer - days
 	"""
-	return _hebrewNewYear(year + 1) - _hebrewNewYear(year)
+	return hebrewYearInfo(year).length
 
 def _isLongMarheshvan(year):
 	"""
@@ -517,13 +773,7 @@ def _lastDayOfHebrewMonth(year, month):
 	Return value:
 	[29, 30]
 	"""
-	if month in [2, 4, 6, 10, 13] or \
-		(month == 12 and not _isHebrewLeapYear(year)) or \
-		(month == 8 and not _isLongMarheshvan(year)) or \
-		(month == 9 and _isShortKislev(year)):
-		return 29
-	else:
-		return 30
+	return hebrewYearInfo(year).monthLengths[month]
 
 def fixedFromHebrew(year, month, day):
 	"""
@@ -544,11 +794,8 @@ def fixedFromHebrew(year, month, day):
 	>>> fixedFromHebrew(5756, SHEVAT, 15)
 	728694
 	"""
-	if month < TISHRI:
-		ms = range(TISHRI, _lastMonthOfHebrewYear(year) + 1) + range(NISAN, month)
-	else:
-		ms = range(TISHRI, month)
-	return _hebrewNewYear(year) + day - 1 + sum(map((lambda x: _lastDayOfHebrewMonth(year, x)), ms))
+	info = hebrewYearInfo(year)
+	return info.newYear + info.monthStarts[month] + day - 1
 
 def hebrewFromFixed(date):
 	"""
@@ -564,22 +811,378 @@ def hebrewFromFixed(date):
 	>>> hebrewFromFixed(728694)
 	[5756, 11, 15]
 	"""
-	approx = int(math.floor((date - HEBREWEPOCH)/(35975351.0/98496))) + 1
-	y = approx - 1
-	while _hebrewNewYear(y) <= date:
-		y = y + 1
-	year = int(y - 1)
-	if date < fixedFromHebrew(year, NISAN, 1):
-		start = TISHRI
-	else:
-		start = NISAN
-	m = start
-	while not date <= fixedFromHebrew(year, m, _lastDayOfHebrewMonth(year, m)):
-		m = m + 1
-	month = m
-	day = date - fixedFromHebrew(year, month, 1) + 1
+	# Counting from half a year before the date, the mean year length
+	# estimate is either exact or one year too high.
+	year = (date - HEBREWEPOCH + 180)*98496//35975351 + 1
+	info = hebrewYearInfo(year)
+	if date < info.newYear:
+		year = year - 1
+		info = hebrewYearInfo(year)
+	offset = date - info.newYear
+	month = info.months[bisect.bisect_right(info.monthOffsets, offset) - 1]
+	day = offset - info.monthStarts[month] + 1
 	return [year, month, day]
 
+def molad(year, month):
+	"""
+	The mean conjunction (molad) of a Hebrew month, computed exactly in
+	parts.
+	
+	Arguments:
+	year - Hebrew year
+	month - Hebrew month
+	
+	Return value:
+	[integer, [0..23], [0..59], [0..17]] - [fixed day number, hour,
+	minute, parts], the time of day counted from midnight as in the
+	announcement of the molad. There are 18 parts in a minute.
+	
+	Example:
+	The molad of the first Tishri, BaHaRD, was on Sunday evening.
+	>>> molad(1, TISHRI)
+	[-1373428, 23, 11, 6]
+	>>> dayOfWeekFromFixed(molad(1, TISHRI)[0])
+	0
+	"""
+	day, parts = divmod(_moladParts(month, year), DAYPARTS)
+	hour, parts = divmod(parts, HOURPARTS)
+	minute, parts = divmod(parts, HOURPARTS//60)
+	return [day, hour, minute, parts]
+
+_moladTableCache = _LRUCache(16)
+
+def moladTable(year):
+	"""
+	Cached molad of every month of a Hebrew year.
+	
+	Argument:
+	year - Hebrew year
+	
+	Return value:
+	tuple indexed by Hebrew month of molad() results; None for ADARII
+	of a year that is not a leap year. The entries must not be modified.
+	"""
+	table = _moladTableCache.get(year)
+	if table is None:
+		table = [None] * 14
+		for month in range(NISAN, _lastMonthOfHebrewYear(year) + 1):
+			table[month] = molad(year, month)
+		table = tuple(table)
+		_moladTableCache.put(year, table)
+	return table
+
+# Date values
+
+class HDate(object):
+	"""
+	Immutable date with lazily cached Gregorian and Hebrew views.
+	
+	An HDate is a fixed day number that converts itself to the Gregorian
+	and Hebrew calendars at most once. It supports adding and subtracting
+	days, comparison and hashing on the fixed day number alone.
+	
+	Examples:
+	>>> d = HDate.fromGregorian(2007, FEBRUARY, 25)
+	>>> d.hebrew, d.weekday
+	((5767, 12, 7), 0)
+	>>> (d + 7).gregorian
+	(2007, 3, 4)
+	>>> HDate.fromHebrew(5767, ADAR, 14) - d
+	7
+	>>> d < d + 1 and d == HDate(d.fixed)
+	True
+	>>> d.__lt__(d.toDate())
+	NotImplemented
+	>>> import copy, pickle
+	>>> copy.copy(d) == d == pickle.loads(pickle.dumps(d, 2)) == pickle.loads(pickle.dumps(d))
+	True
+	"""
+	__slots__ = ('fixed', '_gregorian', '_hebrew')
+
+	def __init__(self, fixed, gregorian=None, hebrew=None):
+		"""
+		Arguments:
+		fixed - fixed day number
+		gregorian - (year, month, day) of fixed, if already known
+		hebrew - (year, month, day) of fixed, if already known
+		"""
+		object.__setattr__(self, 'fixed', fixed)
+		object.__setattr__(self, '_gregorian', gregorian)
+		object.__setattr__(self, '_hebrew', hebrew)
+
+	def fromGregorian(cls, year, month, day):
+		"""HDate of a Gregorian date"""
+		return cls(fixedFromGregorian(year, month, day), gregorian=(year, month, day))
+	fromGregorian = classmethod(fromGregorian)
+
+	def fromHebrew(cls, year, month, day):
+		"""HDate of a Hebrew date"""
+		return cls(fixedFromHebrew(year, month, day), hebrew=(year, month, day))
+	fromHebrew = classmethod(fromHebrew)
+
+	def fromDate(cls, date):
+		"""HDate of a datetime.date or datetime.datetime, or date itself if
+		it already is an HDate"""
+		if isinstance(date, HDate):
+			return date
+		return cls.fromGregorian(date.year, date.month, date.day)
+	fromDate = classmethod(fromDate)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("HDate is immutable")
+
+	def __reduce__(self):
+		return (HDate, (self.fixed,))
+
+	def gregorian(self):
+		if self._gregorian is None:
+			object.__setattr__(self, '_gregorian', tuple(gregorianFromFixed(self.fixed)))
+		return self._gregorian
+	gregorian = property(gregorian, doc="(year, month, day) in the Gregorian calendar")
+
+	def hebrew(self):
+		if self._hebrew is None:
+			object.__setattr__(self, '_hebrew', tuple(hebrewFromFixed(self.fixed)))
+		return self._hebrew
+	hebrew = property(hebrew, doc="(year, month, day) in the Hebrew calendar")
+
+	def weekday(self):
+		return dayOfWeekFromFixed(self.fixed)
+	weekday = property(weekday, doc="weekday as returned by dayOfWeekFromFixed()")
+
+	def toDate(self):
+		"""The date as a datetime.date"""
+		import datetime
+		return datetime.date(*self.gregorian)
+
+	def __add__(self, days):
+		if isinstance(days, HDate):
+			return NotImplemented
+		return HDate(self.fixed + days)
+	__radd__ = __add__
+
+	def __sub__(self, other):
+		if isinstance(other, HDate):
+			return self.fixed - other.fixed
+		return HDate(self.fixed - other)
+
+	def __eq__(self, other):
+		return isinstance(other, HDate) and self.fixed == other.fixed
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __lt__(self, other):
+		if not isinstance(other, HDate):
+			return NotImplemented
+		return self.fixed < other.fixed
+
+	def __le__(self, other):
+		if not isinstance(other, HDate):
+			return NotImplemented
+		return self.fixed <= other.fixed
+
+	def __gt__(self, other):
+		if not isinstance(other, HDate):
+			return NotImplemented
+		return self.fixed > other.fixed
+
+	def __ge__(self, other):
+		if not isinstance(other, HDate):
+			return NotImplemented
+		return self.fixed >= other.fixed
+
+	def __hash__(self):
+		return hash(self.fixed)
+
+	def __repr__(self):
+		return "HDate(%d)" % self.fixed
+
+# Date ranges
+
+def daysFromFixed(start, end):
+	"""
+	Iterate over a range of fixed day numbers with their dates.
+	
+	Only the first day is converted, the following dates are found by
+	stepping day, month and year forward, so each day costs a few
+	integer operations.
+	
+	Arguments:
+	start - first fixed day number
+	end - fixed day number after the last one
+	
+	Return value:
+	iterator of (fixed, [year, month, day], [year, month, day], weekday)
+	- fixed day number, Gregorian date, Hebrew date and weekday as
+	returned by dayOfWeekFromFixed()
+	
+	Example:
+	>>> for day in daysFromFixed(733498, 733500): print day
+	(733498, [2009, 4, 1], [5769, 1, 7], 3)
+	(733499, [2009, 4, 2], [5769, 1, 8], 4)
+	"""
+	if start >= end:
+		return
+	gYear, gMonth, gDay = gregorianFromFixed(start)
+	gLast = _lastDayOfGregorianMonth(gYear, gMonth)
+	hYear, hMonth, hDay = hebrewFromFixed(start)
+	info = hebrewYearInfo(hYear)
+	hLast = info.monthLengths[hMonth]
+	weekday = dayOfWeekFromFixed(start)
+	for date in xrange(start, end):
+		yield date, [gYear, gMonth, gDay], [hYear, hMonth, hDay], weekday
+
+		weekday += 1
+		if weekday == 7:
+			weekday = SUNDAY
+
+		gDay += 1
+		if gDay > gLast:
+			gDay = 1
+			if gMonth == DECEMBER:
+				gYear += 1
+				gMonth = JANUARY
+			else:
+				gMonth += 1
+			gLast = _lastDayOfGregorianMonth(gYear, gMonth)
+
+		hDay += 1
+		if hDay > hLast:
+			hDay = 1
+			if hMonth == ELUL:
+				hYear += 1
+				info = hebrewYearInfo(hYear)
+				hMonth = TISHRI
+			elif hMonth == _lastMonthOfHebrewYear(hYear):
+				hMonth = NISAN
+			else:
+				hMonth += 1
+			hLast = info.monthLengths[hMonth]
+
+# Batch conversions
+#
+# Array in, array out versions of the conversions above, for converting
+# a whole vector of dates in one call. They require numpy; the scalar
+# functions remain the reference implementation.
+
+def _asIntArray(x):
+	if numpy is None:
+		raise ImportError("numpy is required for the batch conversions")
+	return numpy.asarray(x, dtype=numpy.int64)
+
+def dayOfWeekFromFixedArray(date):
+	"""
+	Array version of dayOfWeekFromFixed().
+	
+	Argument:
+	date - array of fixed day numbers
+	
+	Return value:
+	array of [0..6] - 0 == Sunday .. 6 == Saturday
+	"""
+	return _asIntArray(date) % 7
+
+def fixedFromGregorianArray(year, month, day):
+	"""
+	Array version of fixedFromGregorian().
+	
+	Arguments:
+	year - array of Gregorian years
+	month - array of Gregorian months
+	day - array of Gregorian days
+	
+	Return value:
+	array of fixed day numbers
+	"""
+	year, month, day = _asIntArray(year), _asIntArray(month), _asIntArray(day)
+	m = _amod((month - 2), 12)
+	y = year + (month + 9)//12
+	return GREGORIANEPOCH - 1 - 306 + 365*(y - 1) + (y - 1)//4 - (y - 1)//100 + (y - 1)//400 + (3*m - 1)//5 + 30*(m - 1) + day
+
+def _gregorianYearFromFixedArray(date):
+	approx = (date - GREGORIANEPOCH + 2)*400//146097
+	start = GREGORIANEPOCH + 365*approx + approx//4 - approx//100 + approx//400
+	return numpy.where(date < start, approx, approx + 1)
+
+def gregorianFromFixedArray(date):
+	"""
+	Array version of gregorianFromFixed().
+	
+	Argument:
+	date - array of fixed day numbers
+	
+	Return value:
+	(year, month, day) - tuple of arrays
+	"""
+	date = _asIntArray(date)
+	y = _gregorianYearFromFixedArray(GREGORIANEPOCH - 1 + date + 306)
+	priorDays = date - fixedFromGregorianArray(y - 1, 3, 1)
+	month = _amod((5*priorDays + 155)//153 + 2, 12)
+	year = y - (month + 9)//12
+	day = date - fixedFromGregorianArray(year, month, 1) + 1
+	return year, month, day
+
+def _hebrewYearTables(years):
+	"""
+	HebrewYearInfo of each distinct year as arrays.
+	
+	Argument:
+	years - array of Hebrew years
+	
+	Return value:
+	(index, newYear, monthStarts, monthOffsets, months) - index maps
+	each element of years to a row of the other arrays. monthOffsets
+	of 12 month years is padded with an offset beyond any date.
+	"""
+	distinct, index = numpy.unique(years, return_inverse=True)
+	infos = [hebrewYearInfo(y) for y in distinct.tolist()]
+	newYear = numpy.array([info.newYear for info in infos], dtype=numpy.int64)
+	monthStarts = numpy.array([info.monthStarts for info in infos], dtype=numpy.int64)
+	monthOffsets = numpy.array([info.monthOffsets + (400,)*(13 - len(info.months)) for info in infos], dtype=numpy.int64)
+	months = numpy.array([info.months + (NISAN,)*(13 - len(info.months)) for info in infos], dtype=numpy.int64)
+	return index, newYear, monthStarts, monthOffsets, months
+
+def fixedFromHebrewArray(year, month, day):
+	"""
+	Array version of fixedFromHebrew().
+	
+	Arguments:
+	year - array of Hebrew years
+	month - array of Hebrew months
+	day - array of Hebrew days
+	
+	Return value:
+	array of fixed day numbers
+	"""
+	year, month, day = numpy.broadcast_arrays(_asIntArray(year), _asIntArray(month), _asIntArray(day))
+	index, newYear, monthStarts, _, _ = _hebrewYearTables(year.ravel())
+	fixed = newYear[index] + monthStarts[index, month.ravel()] + day.ravel() - 1
+	return fixed.reshape(year.shape)
+
+def hebrewFromFixedArray(date):
+	"""
+	Array version of hebrewFromFixed().
+	
+	Argument:
+	date - array of fixed day numbers
+	
+	Return value:
+	(year, month, day) - tuple of arrays
+	"""
+	date = _asIntArray(date)
+	shape = date.shape
+	date = date.ravel()
+	year = (date - HEBREWEPOCH + 180)*98496//35975351 + 1
+	index, newYear = _hebrewYearTables(year)[:2]
+	year = numpy.where(date < newYear[index], year - 1, year)
+	index, newYear, monthStarts, monthOffsets, months = _hebrewYearTables(year)
+	offset = date - newYear[index]
+	k = (offset[:, numpy.newaxis] >= monthOffsets[index]).sum(axis=1) - 1
+	month = months[index, k]
+	day = offset - monthStarts[index, month] + 1
+	return year.reshape(shape), month.reshape(shape), day.reshape(shape)
+
 # test functions
 def _test():
 	import doctest
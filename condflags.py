@@ -0,0 +1,111 @@
+"""
+condflags.py is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+condflags.py is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Flags as bitmasks.
+
+Every flag name is interned to a bit of its own, so that a set of flags
+is an integer and testing a <cond flags="a|b"> against the flags of a
+day is a single AND of two masks.
+
+Example:
+>>> day = DayContext(flagMask('purim|rosh-hodesh'))
+>>> str(day), 'purim' in day
+('purim|rosh-hodesh', True)
+>>> day.matches(compileFlags('hannuka|purim')), day.matches(compileFlags('pesah'))
+(True, False)
+"""
+
+_flagBits = {}
+_flagNames = []
+
+def flagBit(name):
+  """Get the bit of a flag name, registering the name if it is new"""
+  bit = _flagBits.get(name)
+  if bit is None:
+    bit = _flagBits[name] = 1 << len(_flagNames)
+    _flagNames.append(name)
+  return bit
+
+def flagMask(names):
+  """Get the mask of a '|' separated string or a sequence of flag names"""
+  if isinstance(names, basestring):
+    names = names.split('|')
+  mask = 0
+  for name in names:
+    if name:
+      mask |= flagBit(name)
+  return mask
+
+def flagNames(mask):
+  """Get the names of the flags in mask, in registration order"""
+  names = []
+  bit = 1
+  for name in _flagNames:
+    if mask & bit:
+      names.append(name)
+    bit <<= 1
+  return names
+
+_compiled = {}
+
+def compileFlags(spec):
+  """Get the mask of a cond flags attribute, e.g. 'hannuka|purim'. The
+  masks are cached by attribute string."""
+  mask = _compiled.get(spec)
+  if mask is None:
+    mask = _compiled[spec] = flagMask(spec)
+  return mask
+
+class DayContext(object):
+  """The flags of a day as a bitmask.
+
+  str() gives the flag names '|' separated, as getCalendarFlags used
+  to return them."""
+  __slots__ = ('mask',)
+
+  def __init__(self, mask=0):
+    self.mask = mask
+
+  def matches(self, mask):
+    """True if any of the flags in mask is set"""
+    return bool(self.mask & mask)
+
+  def names(self):
+    return flagNames(self.mask)
+
+  def __contains__(self, name):
+    return bool(self.mask & flagBit(name))
+
+  def __eq__(self, other):
+    return isinstance(other, DayContext) and self.mask == other.mask
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __hash__(self):
+    return hash(self.mask)
+
+  def __str__(self):
+    return "|".join(self.names())
+
+  def __repr__(self):
+    return "DayContext(%r)" % str(self)
+
+# test functions
+def _test():
+  import doctest
+  doctest.testmod()
+
+if __name__ == "__main__":
+  _test()
@@ -0,0 +1,377 @@
+#!/usr/bin/python
+# -*- Encoding: utf-8 -*-
+
+"""
+condhtmlir.py is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+condhtmlir.py is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Compiler of the conditional html of the prayers into a list of
+rendering operations, which CondHtmlTextView renders without parsing.
+
+The <def>, <get> and <insert> elements, the white space and the list
+numbering are resolved by the compiler, so that the operations are
+
+  ('t', text)              insert text
+  ('span', style)          begin a span with a css style, or None
+  ('a', style, href, type) begin a link
+  ('/span',)               end the innermost span or link
+  ('p',)                   paragraph break
+  ('line',)                line break, unless at the start of a line
+  ('img', src, alt)        image
+  ('cond', flags)          begin a cond with a '|' separated flags list
+  ('else',)                begin the else branch of the innermost cond
+  ('/cond',)               end the innermost cond
+
+The operations of a file are cached on disk, and are compiled again
+when the content hash of the file, or of a file that it inserts,
+changes. The modification times are not trusted, as they may have a
+resolution of seconds, e.g. on vfat.
+
+Example:
+>>> compile_html("<body>Hello <cond flags='purim'><p/>world</cond></body>")
+[('span', None), ('t', u'Hello '), ('span', None), ('cond', u'purim'), ('span', None), ('p',), ('/span',), ('t', u'world'), ('/cond',), ('/span',), ('/span',)]
+"""
+
+import os
+import re
+import hashlib
+import warnings
+import cPickle
+import xml.sax, xml.sax.handler
+from cStringIO import StringIO
+
+# Change when the operations change, to invalidate the cached files
+IR_VERSION = 2
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.MaemoSiddur', 'ir')
+
+whitespace_rx = re.compile("\\s+")
+allwhitespace_rx = re.compile("^\\s*$")
+
+# A tag after which a reader may be pushed, see HtmlCompiler.endElement()
+include_rx = re.compile(r"<\s*/?\s*(get|insert)\b[^>]*>")
+
+class BufferedTokenReader:
+    """Reads a reader in blocks, and splits the text at the tags after
+    which other text may be inserted."""
+    block_size = 65536
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.buffer = ''
+        self.eof = False
+
+    def read(self):
+        """Return the text up to and including the next get or insert
+        tag, or all the complete tags read so far if there is none. Return
+        an empty string at the end of the reader."""
+        while 1:
+            m = include_rx.search(self.buffer)
+            if m is not None:
+                ret_text = self.buffer[:m.end()]
+                self.buffer = self.buffer[m.end():]
+                return ret_text
+            if self.eof:
+                ret_text = self.buffer
+                self.buffer = ''
+                return ret_text
+            # Keep a tag that may be cut at the end of the block
+            cut = self.buffer.rfind('<')
+            if cut > 0:
+                ret_text = self.buffer[:cut]
+                self.buffer = self.buffer[cut:]
+                return ret_text
+            data = self.reader.read(self.block_size)
+            if not data:
+                self.eof = True
+            self.buffer += data
+
+class InsertReader():
+    """A reader class that supports the concept of pushing another
+    reader in the middle of the use of a first reader. This may
+    be used for supporting insertion commands."""
+    def __init__(self):
+        self.reader_stack = []
+
+    def push(self,reader):
+        self.reader_stack += [BufferedTokenReader(reader)]
+
+    def pop(self):
+        self.reader_stack.pop()
+
+    def close(self):
+        """Called by the parser when it is done"""
+        self.reader_stack = []
+
+    def __iter__(self):
+        return self
+
+    def read(self,n=-1):
+        """Read from the top most stack element. Never trancends elements.
+
+        The text is returned in chunks that end right after a get or
+        insert tag, so that the reader that such a tag pushes is parsed
+        before the rest of the text.
+        """
+        while len(self.reader_stack)>0:
+            ret_text = self.reader_stack[-1].read()
+            if ret_text == '':
+                self.reader_stack.pop()
+                continue
+            return ret_text
+        return ''
+
+    def next(self):
+        while len(self.reader_stack)>0:
+            try:
+                v = self.reader_stack[-1].reader.next()
+            except StopIteration:
+                self.reader_stack.pop()
+                continue
+            return v
+        raise StopIteration
+
+class HtmlCompiler(xml.sax.handler.ContentHandler):
+    """Compiles the SAX events of a document into the operations of the
+    module documentation"""
+
+    def __init__(self, insert_reader):
+        xml.sax.handler.ContentHandler.__init__(self)
+        self.ops = []
+        self.includes = [] # the files inserted by <insert>
+        self.text = [] # the pieces of the text since the last element
+        self.list_counters = [] # stack (top at head) of list
+                                # counters, or None for unordered list
+        self.definitions={}
+        self.defining=False
+        self.insert_reader=insert_reader
+
+    def _flush_text(self):
+        if not self.text:
+            return
+        self.ops.append(('t', ''.join(self.text).replace('\n', '')))
+        self.text = []
+
+    def characters(self, content):
+        if self.defining:
+            # tbd insert attribts...
+            self.def_text.write(content)
+            return
+
+        if allwhitespace_rx.match(content) is not None:
+            return
+        self.text.append(whitespace_rx.sub(' ', content))
+
+    def startElement(self, name, attrs):
+        self._flush_text()
+
+        if self.defining:
+            # tbd insert attribts...
+            attr_format = []
+            for lbl in attrs.keys():
+                attr_format += ['%s=\'%s\''%(lbl,attrs[lbl])]
+            v = '<%s %s>'%(name, " ".join(attr_format))
+            self.def_text.write(v)
+            return
+
+        if name == 'def':
+            self.defining=True
+            self.def_text = StringIO()
+            self.def_name = attrs['name']
+            return
+
+        try:
+            style = attrs['style']
+        except KeyError:
+            style = None
+
+        if name == 'a':
+            try:
+                type_ = attrs['type']
+            except KeyError:
+                type_ = None
+            self.ops.append(('a', style, attrs['href'], type_))
+        else:
+            self.ops.append(('span', style))
+
+        if name == 'br':
+            pass # handled in endElement
+        elif name == 'else':
+            pass # handled in endElement
+        elif name == 'cond':
+            self.ops.append(('cond', attrs['flags']))
+        elif name == 'get':
+            self.def_name = attrs['name']
+        elif name == 'insert':
+            self.insert_name = attrs['name']
+        elif name == 'p':
+            self.ops.append(('p',))
+        elif name == 'div':
+            self.ops.append(('line',))
+        elif name == 'span':
+            pass
+        elif name == 'ul':
+            self.ops.append(('line',))
+            self.list_counters.insert(0, None)
+        elif name == 'ol':
+            self.ops.append(('line',))
+            self.list_counters.insert(0, 0)
+        elif name == 'li':
+            if self.list_counters[0] is None:
+                li_head = unichr(0x2022)
+            else:
+                self.list_counters[0] += 1
+                li_head = "%i." % self.list_counters[0]
+            self.text = [' '*len(self.list_counters)*4 + li_head + ' ']
+        elif name == 'img':
+            try:
+                alt = attrs['alt']
+            except KeyError:
+                alt = "Broken image"
+            self.ops.append(('img', attrs['src'], alt))
+        elif name == 'body':
+            pass
+        elif name == 'a':
+            pass
+        else:
+            warnings.warn("Unhandled element '%s'" % name)
+
+    def endElement(self, name):
+        self._flush_text()
+        if self.defining:
+            if name == 'def':
+                self.definitions[self.def_name] = self.def_text.getvalue()
+                self.def_text.close()
+                self.defining=False
+                return
+            else:
+                # tbd insert attribts...
+                self.def_text.write('</%s>'%(name))
+                return
+
+        if name == 'p':
+            pass
+        elif name == 'get':
+            v = self.definitions[self.def_name]
+            self.insert_reader.push(StringIO(v))
+        elif name == 'insert':
+            self.includes.append(os.path.abspath(self.insert_name))
+            self.insert_reader.push(open(self.insert_name))
+        elif name == 'else':
+            self.ops.append(('else',))
+        elif name == 'cond':
+            self.ops.append(('/cond',))
+        elif name == 'div':
+            self.ops.append(('line',))
+        elif name == 'span':
+            pass
+        elif name == 'br':
+            self.ops.append(('t', "\n"))
+        elif name == 'ul':
+            self.list_counters.pop()
+        elif name == 'ol':
+            self.list_counters.pop()
+        elif name == 'li':
+            self.ops.append(('t', "\n"))
+        elif name == 'img':
+            pass
+        elif name == 'body':
+            pass
+        elif name == 'a':
+            pass
+        else:
+            warnings.warn("Unhandled element '%s'" % name)
+        self.ops.append(('/span',))
+
+def _compile(html):
+    """The operations of html and the files it inserts"""
+    parser = xml.sax.make_parser()
+    insert_reader = InsertReader()
+    compiler = HtmlCompiler(insert_reader)
+    parser.setContentHandler(compiler)
+    insert_reader.push(StringIO(html))
+    parser.parse(insert_reader)
+    return compiler.ops, compiler.includes
+
+def compile_html(html):
+    """Compile the conditional html text html into a list of operations"""
+    return _compile(html)[0]
+
+def _cache_file(filename):
+    return os.path.join(CACHE_DIR, hashlib.md5(os.path.abspath(filename)).hexdigest() + '.ir')
+
+def _file_hash(filename):
+    try:
+        f = open(filename, 'rb')
+        try:
+            return hashlib.md5(f.read()).hexdigest()
+        finally:
+            f.close()
+    except IOError:
+        return None
+
+def _read_cache(filename):
+    try:
+        f = open(_cache_file(filename), 'rb')
+        try:
+            entry = cPickle.load(f)
+        finally:
+            f.close()
+    except Exception:
+        return None
+    if entry.get('version') != IR_VERSION:
+        return None
+    for include, content_hash in entry['includes']:
+        if _file_hash(include) != content_hash:
+            return None
+    return entry
+
+def _write_cache(filename, entry):
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        f = open(_cache_file(filename), 'wb')
+        try:
+            cPickle.dump(entry, f, 2)
+        finally:
+            f.close()
+    except (IOError, OSError):
+        pass # The cache is only an optimization
+
+def compile_file(filename, template='%s'):
+    """Compile the file filename, with its text put in template, into a
+    list of operations. The operations are read from the disk cache
+    when filename and the files it inserts have the content hashes that
+    they had when it was compiled."""
+    html = template % open(filename).read()
+    content_hash = hashlib.md5(html).hexdigest()
+    entry = _read_cache(filename)
+    if entry is not None and entry['hash'] == content_hash:
+        return entry['ops']
+
+    ops, includes = _compile(html)
+    entry = {'version': IR_VERSION,
+             'hash': content_hash,
+             'includes': [(include, _file_hash(include)) for include in includes],
+             'ops': ops,
+             }
+    _write_cache(filename, entry)
+    return ops
+
+# test functions
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -30,75 +30,55 @@ try:
 except:
     base_textview=gtk.TextView
     
-import xml.sax, xml.sax.handler
-import re
+import time
 import warnings
-from cStringIO import StringIO
 import urllib2
 import operator
+import condflags
+import condhtmlir
 
 __all__ = ['CondHtmlTextView']
 
-whitespace_rx = re.compile("\\s+")
-allwhitespace_rx = re.compile("^\\s*$")
-
 ## pixels = points * display_resolution
 display_resolution = 0.3514598*(gtk.gdk.screen_height() /
                     float(gtk.gdk.screen_height_mm()))
 
 
-class InsertReader():
-    """A reader class that supports the concept of pushing another
-    reader in the middle of the use of a first reader. This may
-    be used for supporting insertion commands."""
-    def __init__(self):
-        self.reader_stack = []
-
-    def push(self,reader):
-        self.reader_stack += [reader]
-
-    def pop(self):
-        self.reader_stack.pop()
-
-    def __iter__(self):
-        return self
-
-    def read(self,n=-1):
-        """Read from the top most stack element. Never trancends elements.
-        Should it?
-
-        The code below is a hack. It feeds only a single token back to
-        the reader.
-        """
-        while len(self.reader_stack)>0:
-            # Return a single token
-            ret_text = StringIO()
-            state = 0
-            while 1:
-                c = self.reader_stack[-1].read(1)
-                if c=='':
-                    break
-
-                ret_text.write(c)
-                if c=='>':
-                    break
-
-            ret_text = ret_text.getvalue()
-            if ret_text == '':
-                self.reader_stack.pop()
-                continue
-            return ret_text
-        return ''
-
-    def next(self):
-        while len(self.reader_stack)>0:
-            try:
-                v = self.reader_stack[-1].next()
-            except StopIteration:
-                self.reader_stack.pop()
-                continue
-            return v
-        raise StopIteration
+def _branches_shown(branches, flags):
+    """True if all of a sequence of (mask, is_else) cond branches are
+    shown with the flags mask"""
+    for mask, is_else in branches:
+        if bool(flags & mask) == is_else:
+            return False
+    return True
+
+def _line_start(state, flags):
+    """True if the shown text is at the start of a line, given a line
+    state of HtmlRenderer and the flags mask"""
+    while not isinstance(state, bool):
+        branches, at_start, state = state
+        if _branches_shown(branches, flags):
+            return at_start
+    return state
+
+def _cond_outcome(region, flags):
+    """True if the text of a region is shown with the flags mask. The
+    region is (tag, ('cond', mask, is_else)) for the text of a cond or
+    its else, or (tag, ('break', line state)) for a line break that is
+    only needed when the shown text is not at the start of a line."""
+    condition = region[1]
+    if condition[0] == 'break':
+        return not _line_start(condition[1], flags)
+    return bool(flags & condition[1]) != condition[2]
+
+def _show_cond(region, flags):
+    """Hide the text of a cond region if its outcome is false. A shown
+    region leaves invisible unset, so that it does not show the text of
+    an enclosing hidden region, whatever the priorities of the tags."""
+    if _cond_outcome(region, flags):
+        region[0].set_property('invisible-set', False)
+    else:
+        region[0].set_property('invisible', True)
 
 def _parse_css_color(color):
     '''_parse_css_color(css_color) -> gtk.gdk.Color'''
@@ -109,32 +89,63 @@ def _parse_css_color(color):
         return gtk.gdk.color_parse(color)
 
 
+# Style attributes whose value may be relative to the enclosing font
+_context_style_attrs = ('font-size',)
+
+_style_cache = {}
+
+def _parse_style(style):
+    '''_parse_style(css_style) -> tuple of (attribute, value), with the
+    attributes in lower case. The parse is cached by style.'''
+    if style is None:
+        return ()
+    declarations = _style_cache.get(style)
+    if declarations is None:
+        declarations = []
+        for item in style.split(';'):
+            if not item.strip():
+                continue
+            attr, val = item.split(':', 1)
+            declarations.append((attr.strip().lower(), val.strip()))
+        declarations = _style_cache[style] = tuple(declarations)
+    return declarations
+
 # class HtmlEntityResolver(xml.sax.handler.EntityResolver):
 #     def resolveEntity(publicId, systemId):
 #        pass
 
-class HtmlHandler(xml.sax.handler.ContentHandler):
+class HtmlRenderer:
+    """Renders the operations compiled by condhtmlir into a textview"""
     
-    def __init__(self, textview, startiter, flags, insert_reader):
-        xml.sax.handler.ContentHandler.__init__(self)
-        self.textbuf = textview.get_buffer()
+    def __init__(self, textview, textbuf):
+        self.textbuf = textbuf
         self.textview = textview
-        self.iter = startiter
-        self.text = ''
-        self.skip = False
+        self.iter = textbuf.get_end_iter()
+        self.run_text = [] # text not yet inserted, with the tags run_tags
+        self.run_tags = []
+        self.cond_tags = [] # the invisible tag of each open cond branch
+        self.cond_branches = [] # (mask, is_else) of each open cond branch
+        # Whether the shown text is at the start of a line: a bool, or
+        # (branches, at_start, state) for at_start if the cond branches
+        # are shown, and the line state state otherwise.
+        self.line_start = self.iter.starts_line()
         self.styles = [] # a gtk.TextTag or None, for each span level
-        self.list_counters = [] # stack (top at head) of list
-                                # counters, or None for unordered list
-        self.flags=flags
-        self.definitions={}
-        self.defining=False
-        self.insert_reader=insert_reader
+        self.par_range = None # (start, end) offsets not yet paragraph tagged
+
+        # The tags of the tag table by style, see _begin_span()
+        table = self.textbuf.get_tag_table()
+        try:
+            self.tags = table.style_tags
+        except AttributeError:
+            self.tags = table.style_tags = {}
 
         # Create the paragraph spacing tag
-        self.par_tag = self.textbuf.create_tag()
-        self.par_tag.set_property('pixels-below-lines', 7)
-        self.par_tag.set_property('pixels-above-lines', 0)
-#        self.par_tag.set_property('background', '#ffa0a0')
+        self.par_tag = self.tags.get('p')
+        if self.par_tag is None:
+            self.par_tag = self.tags['p'] = self.textbuf.create_tag()
+            self.par_tag.set_property('pixels-below-lines', 7)
+            self.par_tag.set_property('pixels-above-lines', 0)
+#            self.par_tag.set_property('background', '#ffa0a0')
 
     def _parse_style_color(self, tag, value):
         color = _parse_css_color(value)
@@ -357,236 +368,265 @@ class HtmlHandler(xml.sax.handler.ContentHandler):
             __style_methods[style] = method
 
     def _get_style_tags(self):
-        return [tag for tag in self.styles if tag is not None]
+        return [tag for tag in self.styles if tag is not None] + self.cond_tags
+
+    def _advance(self, at_start):
+        """Update the line state after text, which ends a line if at_start,
+        in the open cond branches"""
+        if not self.cond_branches:
+            self.line_start = at_start
+            return
+        branches = tuple(self.cond_branches)
+        state = self.line_start
+        # The states of branches within these are not reached any more
+        while not isinstance(state, bool) and state[0][:len(branches)] == branches:
+            state = state[2]
+        if state == at_start:
+            self.line_start = at_start
+        else:
+            self.line_start = (branches, at_start, state)
 
-    def _begin_span(self, style, tag=None):
-        if style is None:
-            self.styles.append(tag)
+    def _break_line(self):
+        """Break the line, unless the shown text is at its start. When
+        that depends on the flags, the break is a region of its own."""
+        state = self.line_start
+        if state is True:
+            return
+        if state is False:
+            self._insert_text("\n")
+            return
+        condition = ('break', state)
+        tag = self.tags.get(condition)
+        if tag is None:
+            tag = self.tags[condition] = self.textbuf.create_tag()
+            region = (tag, condition)
+            _show_cond(region, self.textview.flags)
+            self.textview.cond_regions.append(region)
+        self.cond_tags.append(tag)
+        self._insert_text("\n")
+        self.cond_tags.pop()
+
+    def _begin_cond_branch(self, mask, is_else):
+        """Start the text of a cond, or of its else if is_else, which is
+        rendered with a tag of its own that hides it when its outcome is
+        false. The tag is registered in the cond_regions of the textview,
+        so that the flags may be changed without rendering again."""
+        key = ('cond', mask, is_else)
+        tag = self.tags.get(key)
+        if tag is None:
+            # All the branches with the same flags and else share a tag,
+            # since they are always shown or hidden together.
+            tag = self.tags[key] = self.textbuf.create_tag()
+            region = (tag, key)
+            _show_cond(region, self.textview.flags)
+            self.textview.cond_regions.append(region)
+        self.cond_tags.append(tag)
+        self.cond_branches.append((mask, is_else))
+
+    def _above_styles(self, tag):
+        """True if tag has a higher priority than the tags of the open
+        spans, so that its properties take precedence over theirs"""
+        priority = tag.get_priority()
+        for style in self.styles:
+            if style is not None and style.get_priority() >= priority:
+                return False
+        return True
+
+    def _begin_span(self, style, anchor=None):
+        """Begin a span with a css style, or a link to anchor, a (href,
+        type) tuple. The tags are shared by the spans with the same
+        declarations in the buffer, unless a shared tag would be of a
+        lower priority than the tag of an enclosing span. A new tag is
+        then created, which is shared from then on."""
+        declarations = _parse_style(style)
+        if not declarations and anchor is None:
+            self.styles.append(None)
             return None
+        key = (declarations, anchor)
+        for attr, val in declarations:
+            if attr in _context_style_attrs:
+                # The value is relative to the font of the enclosing text
+                self._flush_run()
+                attrs = self._get_current_attributes()
+                key += (attrs.font_scale, attrs.font.to_string())
+                break
+        tag = self.tags.get(key)
+        if tag is not None and not self._above_styles(tag):
+            tag = None
         if tag is None:
-            tag = self.textbuf.create_tag()
-        for attr, val in [item.split(':', 1) for item in style.split(';')]:
-            attr = attr.strip().lower()
-            val = val.strip()
-            try:
-                method = self.__style_methods[attr]
-            except KeyError:
-                warnings.warn("Style attribute '%s' requested "
-                              "but not yet implemented" % attr)
-            else:
-                method(self, tag, val)
+            tag = self.tags[key] = self.textbuf.create_tag()
+            if anchor is not None:
+                href, type_ = anchor
+                tag.set_property('foreground', '#0000ff')
+                tag.set_property('underline', pango.UNDERLINE_SINGLE)
+                tag.connect('event', self._anchor_event, href, type_)
+                tag.is_anchor = True
+            for attr, val in declarations:
+                try:
+                    method = self.__style_methods[attr]
+                except KeyError:
+                    warnings.warn("Style attribute '%s' requested "
+                                  "but not yet implemented" % attr)
+                else:
+                    method(self, tag, val)
         self.styles.append(tag)
 
     def _end_span(self):
         self.styles.pop(-1)
 
     def _insert_text(self, text):
-        if self.skip:
+        if not text:
             return
         tags = self._get_style_tags()
-        if tags:
-            self.textbuf.insert_with_tags(self.iter, text, *tags)
+        if tags != self.run_tags:
+            self._flush_run()
+            self.run_tags = tags
+        self.run_text.append(text)
+        self._advance(text.endswith('\n'))
+
+    def _flush_run(self):
+        """Insert the text collected by _insert_text()"""
+        if not self.run_text:
+            return
+        text = ''.join(self.run_text)
+        if self.run_tags:
+            self.textbuf.insert_with_tags(self.iter, text, *self.run_tags)
         else:
             self.textbuf.insert(self.iter, text)
+        self.run_text = []
     
     def _insert_new_paragraph(self):
-        if self.skip:
-            return
-        self.textbuf.insert(self.iter, '\n')
+        self._flush_run()
+        if self.cond_tags:
+            self.textbuf.insert_with_tags(self.iter, '\n', *self.cond_tags)
+        else:
+            self.textbuf.insert(self.iter, '\n')
+        self._advance(True)
 
-        # Apply the line spacing to the entire line. Is there a simpler way?
-        iter_start = self.iter
+        # Apply the line spacing to the entire line. The line usually
+        # overlaps the range of the previous paragraph, so the ranges are
+        # merged, and each merged range is tagged once.
+        iter_start = self.iter.copy()
         iter_start.backward_sentence_start()
         iter_start.set_line_offset(0)
-        self.textbuf.apply_tag(self.par_tag, iter_start, self.textbuf.get_end_iter())
-        self.iter = self.textbuf.get_end_iter()
-        
-    def _flush_text(self):
-        if not self.text:
-            return
-        self._insert_text(self.text.replace('\n', ''))
-        self.text = ''
+        start = iter_start.get_offset()
+        end = self.iter.get_offset()
+        if self.par_range is not None and start <= self.par_range[1]:
+            self.par_range = (min(start, self.par_range[0]), end)
+        else:
+            self._flush_paragraphs()
+            self.par_range = (start, end)
 
+    def _flush_paragraphs(self):
+        """Tag the pending range of paragraphs"""
+        if self.par_range is None:
+            return
+        start, end = self.par_range
+        self.textbuf.apply_tag(self.par_tag,
+                               self.textbuf.get_iter_at_offset(start),
+                               self.textbuf.get_iter_at_offset(end))
+        self.par_range = None
+        
     def _anchor_event(self, tag, textview, event, iter, href, type_):
         if event.type == gtk.gdk.BUTTON_PRESS and event.button == 1:
             self.textview.emit("url-clicked", href, type_)
             return True
         return False
         
-    def characters(self, content):
-        if self.defining:
-            # tbd insert attribts...
-            self.def_text.write(content)
-            return
+    def render(self, ops, start=0, end=None):
+        """Render the list of condhtmlir operations ops[start:end]. Some
+        of the text may only be inserted by flush()."""
+        if end is None or end > len(ops):
+            end = len(ops)
+        for i in xrange(start, end):
+            op = ops[i]
+            name = op[0]
+            if name == 't':
+                self._insert_text(op[1])
+            elif name == 'span':
+                self._begin_span(op[1])
+            elif name == '/span':
+                self._end_span()
+            elif name == 'p':
+                self._insert_new_paragraph()
+            elif name == 'line':
+                self._break_line()
+            elif name == 'cond':
+                self._begin_cond_branch(condflags.compileFlags(op[1]), False)
+            elif name == 'else':
+                self.cond_tags.pop()
+                mask, is_else = self.cond_branches.pop()
+                self._begin_cond_branch(mask, True)
+            elif name == '/cond':
+                self.cond_tags.pop()
+                self.cond_branches.pop()
+            elif name == 'a':
+                style, href, type_ = op[1:]
+                self._begin_span(style, (href, type_))
+            elif name == 'img':
+                self._insert_image(*op[1:])
+            else:
+                warnings.warn("Unknown operation '%s'" % name)
 
-        if allwhitespace_rx.match(content) is not None:
-            return
-        #if self.text:
-        #    self.text += ' '
-        self.text += whitespace_rx.sub(' ', content)
-
-    def startElement(self, name, attrs):
-        self._flush_text()
-
-        if self.defining:
-            # tbd insert attribts...
-            attr_format = []
-            for lbl in attrs.keys():
-                attr_format += ['%s=\'%s\''%(lbl,attrs[lbl])]
-            v = '<%s %s>'%(name, " ".join(attr_format))
-            self.def_text.write(v)
-            return
+    def flush(self):
+        """Insert and tag all the text rendered so far"""
+        self._flush_run()
+        self._flush_paragraphs()
+
+    def finish(self):
+        """End the document with a line break, and flush()"""
+        self._break_line()
+        self.flush()
 
+    def _insert_image(self, src, alt):
         try:
-            style = attrs['style']
-        except KeyError:
-            style = None
-
-        tag = None
-        if name == 'a':
-            tag = self.textbuf.create_tag()
-            tag.set_property('foreground', '#0000ff')
-            tag.set_property('underline', pango.UNDERLINE_SINGLE)
-            try:
-                type_ = attrs['type']
-            except KeyError:
-                type_ = None
-            tag.connect('event', self._anchor_event, attrs['href'], type_)
-            tag.is_anchor = True
-        
-        self._begin_span(style, tag)
-
-        if name == 'br':
-            pass # handled in endElement
-        elif name == 'else':
-            pass # handled in endElement
-        elif name == 'cond':
-            self.skip=True
-            for f in attrs['flags'].split('|'):
-                if f in self.flags:
-                    self.skip=False
-                    break
-        elif name == 'def':
-            self.defining=True
-            self.def_text = StringIO()
-            self.def_name = attrs['name']
-        elif name == 'get':
-            self.def_name = attrs['name']
-        elif name == 'insert':
-            self.insert_name = attrs['name']
-        elif name == 'p':
-            self._insert_new_paragraph()
-        elif name == 'div':
-            if not self.iter.starts_line():
-                self._insert_text("\n")
-        elif name == 'span':
-            pass
-        elif name == 'ul':
-            if not self.iter.starts_line():
-                self._insert_text("\n")
-            self.list_counters.insert(0, None)
-        elif name == 'ol':
-            if not self.iter.starts_line():
-                self._insert_text("\n")
-            self.list_counters.insert(0, 0)
-        elif name == 'li':
-            if self.list_counters[0] is None:
-                li_head = unichr(0x2022)
-            else:
-                self.list_counters[0] += 1
-                li_head = "%i." % self.list_counters[0]
-            self.text = ' '*len(self.list_counters)*4 + li_head + ' '
-        elif name == 'img':
-            try:
-                ## Max image size = 10 MB (to try to prevent DoS)
-                mem = urllib2.urlopen(attrs['src']).read(10*1024*1024)
-                ## Caveat: GdkPixbuf is known not to be safe to load
-                ## images from network... this program is now potentially
-                ## hackable ;)
-                loader = gtk.gdk.PixbufLoader()
-                loader.write(mem); loader.close()
-                pixbuf = loader.get_pixbuf()
-            except Exception, ex:
-                pixbuf = None
-                try:
-                    alt = attrs['alt']
-                except KeyError:
-                    alt = "Broken image"
-            if pixbuf is not None:
-                tags = self._get_style_tags()
-                if tags:
-                    tmpmark = self.textbuf.create_mark(None, self.iter, True)
-
-                self.textbuf.insert_pixbuf(self.iter, pixbuf)
-
-                if tags:
-                    start = self.textbuf.get_iter_at_mark(tmpmark)
-                    for tag in tags:
-                        self.textbuf.apply_tag(tag, start, self.iter)
-                    self.textbuf.delete_mark(tmpmark)
-            else:
-                self._insert_text("[IMG: %s]" % alt)
-        elif name == 'body':
-            pass
-        elif name == 'a':
-            pass
+            ## Max image size = 10 MB (to try to prevent DoS)
+            mem = urllib2.urlopen(src).read(10*1024*1024)
+            ## Caveat: GdkPixbuf is known not to be safe to load
+            ## images from network... this program is now potentially
+            ## hackable ;)
+            loader = gtk.gdk.PixbufLoader()
+            loader.write(mem); loader.close()
+            pixbuf = loader.get_pixbuf()
+        except Exception, ex:
+            pixbuf = None
+        if pixbuf is not None:
+            self._flush_run()
+            tags = self._get_style_tags()
+            if tags:
+                tmpmark = self.textbuf.create_mark(None, self.iter, True)
+
+            self.textbuf.insert_pixbuf(self.iter, pixbuf)
+            self._advance(False)
+
+            if tags:
+                start = self.textbuf.get_iter_at_mark(tmpmark)
+                for tag in tags:
+                    self.textbuf.apply_tag(tag, start, self.iter)
+                self.textbuf.delete_mark(tmpmark)
         else:
-            warnings.warn("Unhandled element '%s'" % name)
-
-    def endElement(self, name):
-        self._flush_text()
-        if self.defining:
-            if name == 'def':
-                self.definitions[self.def_name] = self.def_text.getvalue()
-                self.def_text.close()
-                self.defining=False
-                return
-            else:
-                # tbd insert attribts...
-                self.def_text.write('</%s>'%(name))
-                return
+            self._insert_text("[IMG: %s]" % alt)
 
-        if name == 'p':
-            pass
-#            self._insert_new_paragraph()
-        elif name == 'get':
-            v = self.definitions[self.def_name]
-            self.insert_reader.push(StringIO(v))
-        elif name == 'insert':
-            self.insert_reader.push(open(self.insert_name))
-        elif name == 'else':
-            self.skip=not self.skip
-        elif name == 'cond':
-            self.skip=False
-        elif name == 'div':
-            if not self.iter.starts_line():
-                self._insert_text("\n")
-        elif name == 'span':
-            pass
-        elif name == 'br':
-            self._insert_text("\n")
-        elif name == 'ul':
-            self.list_counters.pop()
-        elif name == 'ol':
-            self.list_counters.pop()
-        elif name == 'li':
-            self._insert_text("\n")
-        elif name == 'img':
-            pass
-        elif name == 'body':
-            pass
-        elif name == 'a':
-            pass
-        else:
-            warnings.warn("Unhandled element '%s'" % name)
-        self._end_span()
 
+def _flag_mask(flags):
+    if isinstance(flags, condflags.DayContext):
+        return flags.mask
+    if isinstance(flags, basestring):
+        return condflags.flagMask(flags)
+    return flags
 
 class CondHtmlTextView(base_textview):
     __gtype_name__ = 'CondHtmlTextView'
     __gsignals__ = {
         'url-clicked': (gobject.SIGNAL_RUN_LAST, None, (str, str)), # href, type
+        'render-progress': (gobject.SIGNAL_RUN_LAST, None, (float,)), # fraction
     }
+
+    # Number of characters rendered before the view is first shown, and
+    # the operations and seconds of each rendering step after that.
+    first_screen_chars = 4000
+    chunk_ops = 20
+    chunk_time = 0.05
     
     def __init__(self):
         base_textview.__init__(self)
@@ -598,7 +638,10 @@ class CondHtmlTextView(base_textview):
         self.connect("enter-notify-event", self.__motion_notify_event)
 #        self.set_pixels_above_lines(5)
 #        self.set_pixels_below_lines(5)
-        self.flags = {}
+        self.flags = 0 # condflags mask
+        self.cond_regions = [] # (tag, mask, is_else) of every cond branch
+        self._rendering = None # (renderer, ops, next op) while rendering
+        self._render_source = None
 
     def __leave_event(self, widget, event):
         if self._changed_cursor:
@@ -627,27 +670,102 @@ class CondHtmlTextView(base_textview):
         return False
 
     def set_flag(self, flag):
-        for f in flag.split('|'):
-            self.flags[f]=1
+        """Set flags, given as a condflags.DayContext or a '|' separated
+        string of names"""
+        self.set_flags(self.flags | _flag_mask(flag))
+
+    def clear_flags(self):
+        self.set_flags(0)
+
+    def set_flags(self, flags):
+        """Replace all flags, given as for set_flag(). The cond regions
+        already displayed whose outcome changes are shown or hidden, while
+        keeping the text at the top of the view in place."""
+        flags = _flag_mask(flags)
+        changed = [region for region in self.cond_regions
+                   if _cond_outcome(region, flags) != _cond_outcome(region, self.flags)]
+        self.flags = flags
+        if not changed:
+            return
+        buffer = self.get_buffer()
+        rect = self.get_visible_rect()
+        top = buffer.create_mark(None, self.get_iter_at_location(rect.x, rect.y), True)
+        for region in changed:
+            _show_cond(region, flags)
+        self.scroll_to_mark(top, 0.0, True, 0.0, 0.0)
+        buffer.delete_mark(top)
 
     def display_html(self, html):
-        buffer = self.get_buffer()
-        ## this works too if libxml2 is not available
-        #parser = xml.sax.make_parser(['drv_libxml2'])
-        parser = xml.sax.make_parser()
-        # parser.setFeature(xml.sax.handler.feature_validation, True)
-        self.insert_reader = InsertReader()
-        parser.setContentHandler(HtmlHandler(self,
-                                             buffer.get_end_iter(),
-                                             self.flags,
-                                             self.insert_reader))
-        #parser.setEntityResolver(HtmlEntityResolver())
-        self.insert_reader.push(StringIO(html))
-        parser.parse(self.insert_reader)
-        
-        eob = buffer.get_end_iter()
-        if not eob.starts_line():
-            buffer.insert(eob, "\n")
+        self.display_ops(condhtmlir.compile_html(html))
+
+    def display_file(self, filename, template='%s'):
+        """Display the file filename with its text put in template, see
+        condhtmlir.compile_file()"""
+        self.display_ops(condhtmlir.compile_file(filename, template))
+
+    def display_ops(self, ops):
+        """Display html compiled by condhtmlir.
+
+        The beginning of the text, enough to fill the first screen, is
+        rendered into a new buffer, which then replaces the buffer of the
+        view. The rest is rendered in short steps when gtk is idle, and
+        the render-progress signal is emitted after each step with the
+        fraction of the document that is displayed."""
+        self.finish_display()
+        old_buffer = self.get_buffer()
+        buffer = gtk.TextBuffer(old_buffer.get_tag_table())
+        buffer.insert_range(buffer.get_end_iter(), *old_buffer.get_bounds())
+        renderer = HtmlRenderer(self, buffer)
+
+        end = 0
+        chars = 0
+        while end < len(ops) and chars < self.first_screen_chars:
+            if ops[end][0] == 't':
+                chars += len(ops[end][1])
+            end += 1
+        renderer.render(ops, 0, end)
+        renderer.flush()
+        self.set_buffer(buffer)
+
+        self._rendering = (renderer, ops, end)
+        if end < len(ops):
+            self.emit('render-progress', float(end)/len(ops))
+            self._render_source = gobject.idle_add(self.__render_step)
+        else:
+            self.__end_display()
+
+    def finish_display(self):
+        """Render the rest of the document being displayed at once"""
+        if self._rendering is None:
+            return
+        gobject.source_remove(self._render_source)
+        renderer, ops, start = self._rendering
+        renderer.render(ops, start)
+        renderer.flush()
+        self.__end_display()
+
+    def __render_step(self):
+        renderer, ops, start = self._rendering
+        deadline = time.time() + self.chunk_time
+        while 1:
+            # At least one chunk, so that every step makes progress
+            renderer.render(ops, start, start + self.chunk_ops)
+            start += self.chunk_ops
+            if start >= len(ops) or time.time() >= deadline:
+                break
+        renderer.flush()
+        if start < len(ops):
+            self._rendering = (renderer, ops, start)
+            self.emit('render-progress', float(start)/len(ops))
+            return True
+        self.__end_display()
+        return False
+
+    def __end_display(self):
+        self._rendering[0].finish()
+        self._rendering = None
+        self._render_source = None
+        self.emit('render-progress', 1.0)
 #        par_tag = buffer.create_tag()
 #        par_tag.set_property('pixels-below-lines', 50)
 #
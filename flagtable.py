@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# -*- Encoding: utf-8 -*-
+
+"""
+flagtable.py is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+flagtable.py is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Precomputed calendar flags of a range of Hebrew years.
+
+The flags of every day are computed with JHolidays.getYearFlags() and
+written as one bitmask per day to a binary file, which is memory
+mapped when read, so that the flags of a date are a single index into
+the table. The file consists of the little endian header
+
+  magic 'HFT2', first Hebrew year, number of years, fixed day of the
+  first day, number of days, 32 bit words per mask, length of the names,
+  JHolidays.rulesHash() of the rules that computed the flags
+
+followed by the flag names '|' separated, in the order of their bits,
+and two runs of number of days + 1 masks, for Israel and for the
+diaspora. The extra day is the first day after the range, which is
+what the flags of the last day are after nightfall. A table of other
+rules than those of JHolidays is not loaded.
+
+The application uses the flags.dat next to this file if it is valid,
+and otherwise the one in ~/.MaemoSiddur, which openTable() writes when
+it is missing or was written with other rules.
+
+Run by doing
+
+    python flagtable.py [first year [number of years [file]]]
+
+The default is the 60 Hebrew years from 5770, i.e. 2009-2069. The
+tests are run by
+
+    python flagtable.py test
+
+Example:
+>>> import datetime, tempfile
+>>> filename = tempfile.mktemp()
+>>> writeTable(filename, 5772, 2)
+>>> table = FlagTable(filename)
+>>> table.getFlags(datetime.date(2012, 3, 8), False, False)
+DayContext('purim|horef|parasha-ki-tisa')
+>>> table.getFlags(datetime.date(2012, 3, 8), False, True)
+DayContext('horef|parasha-ki-tisa')
+>>> print table.getFlags(datetime.date(2000, 1, 1), False, False)
+None
+>>> rules = JHolidays.FLAGRULES
+>>> JHolidays.FLAGRULES = rules + [('kaitz', {'months': [8]})]
+>>> print loadTable(filename)
+None
+>>> JHolidays.FLAGRULES = rules
+>>> table.close(); os.remove(filename)
+>>> table = openTable(os.path.join(filename, 'flags.dat'), 5772, 1)
+>>> table.getFlags(datetime.date(2012, 3, 8), False, False) == JHolidays.getCalendarFlags(datetime.date(2012, 3, 8), False, False)
+True
+>>> table.close(); os.remove(os.path.join(filename, 'flags.dat')); os.rmdir(filename)
+"""
+
+import os
+import sys
+import mmap
+import struct
+import calendrical
+import condflags
+import JHolidays
+
+FLAGTABLEMAGIC = 0x32544648 # 'HFT2'
+FLAGTABLEFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flags.dat')
+CACHEFILE = os.path.join(os.path.expanduser('~'), '.MaemoSiddur', 'flags.dat')
+
+# The default range of years
+FIRSTYEAR = 5770
+YEARS = 60
+
+_HEADER = '<IiiiiiI16s'
+
+def writeTable(filename, first, count):
+  """Write the flags of the Hebrew years first to first + count - 1"""
+  planes = []
+  for isDiaspora in (False, True):
+    masks = []
+    for year in xrange(first, first + count):
+      masks += JHolidays.getYearFlags(year, isDiaspora)[:-1]
+    masks.append(JHolidays.getYearFlags(first + count, isDiaspora)[0])
+    planes.append(masks)
+
+  names = '|'.join(condflags._flagNames)
+  words = max(1, (len(condflags._flagNames) + 31)//32)
+  start = calendrical.hebrewYearInfo(first).newYear
+  days = len(planes[0]) - 1
+
+  f = open(filename, 'wb')
+  try:
+    f.write(struct.pack(_HEADER, FLAGTABLEMAGIC, first, count, start, days,
+                        words, len(names), JHolidays.rulesHash()))
+    f.write(names)
+    for masks in planes:
+      data = []
+      for mask in masks:
+        for w in range(words):
+          data.append((mask >> 32*w) & 0xffffffff)
+      f.write(struct.pack('<%dI' % len(data), *data))
+  finally:
+    f.close()
+
+class FlagTable(object):
+  """A memory mapped flag table written by writeTable()"""
+
+  def __init__(self, filename=FLAGTABLEFILE):
+    f = open(filename, 'rb')
+    try:
+      self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+      f.close()
+    (magic, self.first, self.count, self.start, self.days, self._words,
+     namesLength, rulesHash) = struct.unpack_from(_HEADER, self._map, 0)
+    if magic != FLAGTABLEMAGIC:
+      self.close()
+      raise ValueError("%s is not a flag table" % filename)
+    if rulesHash != JHolidays.rulesHash():
+      self.close()
+      raise ValueError("%s has the flags of other rules" % filename)
+    offset = struct.calcsize(_HEADER)
+    names = self._map[offset:offset + namesLength].split('|')
+    self._offset = offset + namesLength
+    self._format = '<%dI' % self._words
+
+    # The bits of the table are those of the names in the file, which
+    # are mapped to the bits registered in condflags if they differ.
+    self._bits = [condflags.flagBit(name) for name in names]
+    if self._bits == [1 << i for i in range(len(names))]:
+      self._bits = None
+
+  def close(self):
+    self._map.close()
+
+  def getMask(self, date, isDiaspora, isNightFall):
+    """The flag mask of a datetime.date or calendrical.HDate, as
+    JHolidays.getCalendarFlags(), or None if it is not in the table"""
+    i = calendrical.HDate.fromDate(date).fixed - self.start + bool(isNightFall)
+    if i < 0 or i > self.days:
+      return None
+    i += bool(isDiaspora)*(self.days + 1)
+    mask = 0
+    shift = 0
+    for word in struct.unpack_from(self._format, self._map, self._offset + 4*self._words*i):
+      mask |= word << shift
+      shift += 32
+    if self._bits is not None:
+      mapped = 0
+      for n, bit in enumerate(self._bits):
+        if mask >> n & 1:
+          mapped |= bit
+      mask = mapped
+    return mask
+
+  def getFlags(self, date, isDiaspora, isNightFall):
+    """The flags of date as a condflags.DayContext, or None if it is
+    not in the table"""
+    mask = self.getMask(date, isDiaspora, isNightFall)
+    if mask is None:
+      return None
+    return condflags.DayContext(mask)
+
+def loadTable(filename=FLAGTABLEFILE):
+  """The flag table in filename, or None if there is no valid table of
+  the current rules"""
+  try:
+    return FlagTable(filename)
+  except (IOError, ValueError, struct.error, mmap.error):
+    return None
+
+def openTable(filename=CACHEFILE, first=FIRSTYEAR, count=YEARS):
+  """The flag table in filename, which is written first if there is no
+  valid table of the current rules. None if it can not be written."""
+  table = loadTable(filename)
+  if table is not None:
+    return table
+  try:
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    # Written aside and renamed, so that no partial table is ever read
+    tmpname = '%s.%d' % (filename, os.getpid())
+    writeTable(tmpname, first, count)
+    os.rename(tmpname, filename)
+  except (IOError, OSError):
+    return None
+  return loadTable(filename)
+
+# test functions
+def _test():
+  import doctest
+  doctest.testmod()
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1 and sys.argv[1] == 'test':
+    _test()
+    sys.exit(0)
+  first = FIRSTYEAR
+  count = YEARS
+  filename = FLAGTABLEFILE
+  if len(sys.argv) > 1:
+    first = int(sys.argv[1])
+  if len(sys.argv) > 2:
+    count = int(sys.argv[2])
+  if len(sys.argv) > 3:
+    filename = sys.argv[3]
+  writeTable(filename, first, count)
+  print "Wrote the flags of Hebrew years %d-%d to %s" % (first, first + count - 1, filename)
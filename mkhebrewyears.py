@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- Encoding: utf-8 -*-
+
+"""
+Generate the Hebrew year table used by calendrical, see YEARTABLEFILE in
+calendrical.py for the format.
+
+Run by doing
+
+    python mkhebrewyears.py [first year [number of years [file]]]
+
+The default is the Hebrew years 3761-7760, i.e. Gregorian years 1-4000.
+"""
+
+import sys
+import struct
+import calendrical
+
+def writeYearTable(filename, first, count):
+	"""Write the New Year of the years first to first + count"""
+	newYears = [calendrical._arithmeticHebrewNewYears(year)[0]
+	            for year in xrange(first, first + count + 1)]
+	f = open(filename, 'wb')
+	try:
+		f.write(struct.pack('<iii', calendrical.YEARTABLEMAGIC, first, count))
+		f.write(struct.pack('<%di' % len(newYears), *newYears))
+	finally:
+		f.close()
+
+if __name__ == '__main__':
+	first = 3761
+	count = 4000
+	filename = calendrical.YEARTABLEFILE
+	if len(sys.argv) > 1:
+		first = int(sys.argv[1])
+	if len(sys.argv) > 2:
+		count = int(sys.argv[2])
+	if len(sys.argv) > 3:
+		filename = sys.argv[3]
+	writeYearTable(filename, first, count)
+	print "Wrote Hebrew years %d-%d to %s" % (first, first + count - 1, filename)
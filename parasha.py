@@ -0,0 +1,190 @@
+"""
+parasha.py is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+parasha.py is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+The weekly Torah portion (parasha).
+
+The readings of a year only depend on the weekday of Rosh Hashana, the
+length of the year and on whether it is read in Israel or in the
+diaspora. The readings of each such year type are laid out once into a
+template of all Shabbatot of the year, after which the parasha of any
+date is a single lookup.
+
+The templates are laid out from the fixed points of the year:
+  - Tzav (in a leap year Metzora) is read before Pesach,
+  - Bamidbar before Shavuot,
+  - Devarim before Tisha BeAv and
+  - Nitzavim before Rosh Hashana.
+When there are fewer Shabbatot than portions up to a fixed point, the
+portions are read together in the customary order of priority. When
+there are more, as when the last day of Pesach falls on Shabbat in the
+diaspora only, the reading continues past the fixed point.
+
+Example:
+>>> import datetime
+>>> getParasha(datetime.date(2012, 7, 28))
+['devarim']
+>>> getParasha(datetime.date(2012, 5, 19)), getParasha(datetime.date(2012, 5, 19), True)
+(['bechukotai'], ['behar', 'bechukotai'])
+"""
+import calendrical
+
+PARSHIYOT = [
+  'bereshit', 'noach', 'lech-lecha', 'vayera', 'chayei-sara', 'toldot',
+  'vayetzei', 'vayishlach', 'vayeshev', 'miketz', 'vayigash', 'vayechi',
+  'shemot', 'vaera', 'bo', 'beshalach', 'yitro', 'mishpatim', 'terumah',
+  'tetzaveh', 'ki-tisa', 'vayakhel', 'pekudei', 'vayikra', 'tzav',
+  'shmini', 'tazria', 'metzora', 'achrei-mot', 'kedoshim', 'emor',
+  'behar', 'bechukotai', 'bamidbar', 'nasso', 'behaalotcha', 'shlach',
+  'korach', 'chukat', 'balak', 'pinchas', 'matot', 'masei', 'devarim',
+  'vaetchanan', 'eikev', 'reeh', 'shoftim', 'ki-teitzei', 'ki-tavo',
+  'nitzavim', 'vayeilech', 'haazinu', 'vezot-haberakhah',
+  ]
+
+# Indices into PARSHIYOT
+BERESHIT = 0
+VAYAKHEL = 21
+TZAV = 24
+TAZRIA = 26
+METZORA = 27
+ACHREI_MOT = 28
+BEHAR = 31
+BAMIDBAR = 33
+CHUKAT = 38
+MATOT = 41
+DEVARIM = 43
+VAETCHANAN = 44
+NITZAVIM = 50
+VAYEILECH = 51
+HAAZINU = 52
+
+def _isHoliday(hebMonth, hebDay, isDiaspora):
+  """True if a Shabbat on this date has a holiday reading"""
+  if hebMonth == calendrical.TISHRI:
+    return (hebDay in (1, 2, 10)
+            or 15 <= hebDay <= 22 + isDiaspora)
+  if hebMonth == calendrical.NISAN:
+    return 15 <= hebDay <= 21 + isDiaspora
+  if hebMonth == calendrical.SIVAN:
+    return 6 <= hebDay <= 6 + isDiaspora
+  return False
+
+def _layout(shabbatot, first, last, doubles):
+  """Lay out the portions from first to last over shabbatot.
+
+  doubles are the first portions of the pairs that may be read
+  together, in order of priority. Returns the readings and the portion
+  following the last one read.
+  """
+  needed = (last - first + 1) - len(shabbatot)
+  joined = [p for p in doubles if first <= p and p + 1 <= last][:max(needed, 0)]
+  readings = []
+  p = first
+  for shabbat in shabbatot:
+    if p in joined:
+      readings.append((p, p + 1))
+      p += 2
+    else:
+      readings.append((p,))
+      p += 1
+  return readings, p
+
+def _buildTemplate(hebYear, isDiaspora):
+  """The readings of every Shabbat of a year, starting with the first
+  Shabbat on or after Rosh Hashana. Each reading is a tuple of indices
+  into PARSHIYOT, or None for a holiday."""
+  info = calendrical.hebrewYearInfo(hebYear)
+  first = calendrical._kDayOnOrAfter(info.newYear, calendrical.SATURDAY)
+  shabbatot = range(first, info.newYear + info.length, 7)
+  pesach = calendrical.fixedFromHebrew(hebYear, calendrical.NISAN, 15)
+  shavuot = calendrical.fixedFromHebrew(hebYear, calendrical.SIVAN, 6)
+  tishaBeav = calendrical.fixedFromHebrew(hebYear, calendrical.AV, 9)
+  sukkot = calendrical.fixedFromHebrew(hebYear, calendrical.TISHRI, 15)
+
+  # Split the Shabbatot without a holiday reading at the fixed points
+  segments = [[], [], [], [], []]
+  for shabbat in shabbatot:
+    hebMonth, hebDay = calendrical.hebrewFromFixed(shabbat)[1:]
+    if _isHoliday(hebMonth, hebDay, isDiaspora):
+      continue
+    if shabbat < sukkot:
+      segments[0].append(shabbat)
+    elif shabbat < pesach:
+      segments[1].append(shabbat)
+    elif shabbat < shavuot:
+      segments[2].append(shabbat)
+    elif shabbat <= tishaBeav:
+      segments[3].append(shabbat)
+    else:
+      segments[4].append(shabbat)
+
+  # Vayeilech is read after Rosh Hashana when there are two Shabbatot
+  # before Sukkot, and together with Nitzavim the year before otherwise.
+  readings = [(VAYEILECH,), (HAAZINU,)][-len(segments[0]):]
+  nextNewYear = calendrical.dayOfWeekFromFixed(info.newYear + info.length)
+  if nextNewYear in (calendrical.MONDAY, calendrical.TUESDAY):
+    lastPortion = NITZAVIM
+  else:
+    lastPortion = VAYEILECH
+
+  if info.isLeap:
+    beforePesach = METZORA
+  else:
+    beforePesach = TZAV
+  p = BERESHIT
+  for segment, last, doubles in [
+      (segments[1], beforePesach, [VAYAKHEL, TAZRIA]),
+      (segments[2], BAMIDBAR, [TAZRIA, ACHREI_MOT, BEHAR]),
+      (segments[3], DEVARIM, [MATOT, CHUKAT])]:
+    segmentReadings, p = _layout(segment, p, last, doubles)
+    readings += segmentReadings
+  # Vaetchanan is always read on the Shabbat after Tisha BeAv
+  segmentReadings, p = _layout(segments[4], VAETCHANAN, lastPortion, [NITZAVIM])
+  readings += segmentReadings
+
+  byShabbat = dict(zip(sum(segments, []), readings))
+  return tuple([byShabbat.get(shabbat) for shabbat in shabbatot])
+
+_templates = {}
+
+def _yearTemplate(hebYear, isDiaspora):
+  """Readings template of the year type of hebYear"""
+  info = calendrical.hebrewYearInfo(hebYear)
+  key = (calendrical.dayOfWeekFromFixed(info.newYear), info.length, bool(isDiaspora))
+  template = _templates.get(key)
+  if template is None:
+    template = _templates[key] = _buildTemplate(hebYear, isDiaspora)
+  return template
+
+def getParashaIndices(date, isDiaspora=False):
+  """Indices into PARSHIYOT of the portion read on the Shabbat on or
+  after the datetime.date or calendrical.HDate date. Empty if that
+  Shabbat has a holiday reading."""
+  day = calendrical.HDate.fromDate(date)
+  shabbat = calendrical.HDate(calendrical._kDayOnOrAfter(day.fixed, calendrical.SATURDAY))
+  hebYear = shabbat.hebrew[0]
+  info = calendrical.hebrewYearInfo(hebYear)
+  first = calendrical._kDayOnOrAfter(info.newYear, calendrical.SATURDAY)
+  return _yearTemplate(hebYear, isDiaspora)[(shabbat.fixed - first)//7] or ()
+
+def getParasha(date, isDiaspora=False):
+  """Names of the portion of the week of date, see getParashaIndices()"""
+  return [PARSHIYOT[p] for p in getParashaIndices(date, isDiaspora)]
+
+# test functions
+def _test():
+  import doctest
+  doctest.testmod()
+
+if __name__ == "__main__":
+  _test()
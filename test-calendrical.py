@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- Encoding: utf-8 -*-
+
+"""
+Differential test of the integer arithmetic in calendrical against the
+original floating point implementation.
+
+Run by doing
+
+    python test-calendrical.py
+
+or, to time the integer conversions against the floating point ones,
+
+    python test-calendrical.py bench
+"""
+
+import sys
+import math
+import timeit
+import calendrical
+from calendrical import _amod, GREGORIANEPOCH, HEBREWEPOCH, NISAN, TISHRI
+
+# The floating point reference implementation, as it was before the
+# conversion to integer arithmetic.
+def floatFixedFromGregorian(year, month, day):
+	m = _amod((month - 2), 12)
+	y = year + math.floor((month + 9)/12.0)
+	return int(GREGORIANEPOCH - 1 - 306 + 365 *(y - 1) + math.floor((y - 1)/4.0) - math.floor((y - 1)/100.0) + math.floor((y - 1)/400.0) + math.floor((3*m - 1)/5.0) + 30*(m - 1) + day)
+
+def floatGregorianYearFromFixed(date):
+	approx = math.floor((date - GREGORIANEPOCH + 2) * 400 / 146097.0)
+	start = GREGORIANEPOCH + 365 * approx + math.floor(approx/4.0) - math.floor(approx/100.0) + math.floor(approx/400.0)
+	if date < start:
+		return int(approx)
+	else:
+		return int(approx + 1)
+
+def floatGregorianFromFixed(date):
+	y = floatGregorianYearFromFixed(GREGORIANEPOCH - 1 + date + 306)
+	priorDays = date - floatFixedFromGregorian(y - 1, 3, 1)
+	month = int(_amod(math.floor((5*priorDays + 155)/153.0) + 2, 12))
+	year = int(y - math.floor((month + 9)/12.0))
+	day = int(date - floatFixedFromGregorian(year, month, 1) + 1)
+	return [year, month, day]
+
+def floatHebrewCalendarElapsedDays(year):
+	monthsElapsed = int(math.floor((235*year - 234)/19.0))
+	partsElapsed = 12084 + 13753*monthsElapsed
+	day = 29 * monthsElapsed + int(math.floor(partsElapsed/25920.0))
+	if (3*(day + 1) % 7) < 3:
+		return day + 1
+	else:
+		return day
+
+def floatHebrewNewYear(year):
+	ny0 = floatHebrewCalendarElapsedDays(year - 1)
+	ny1 = floatHebrewCalendarElapsedDays(year)
+	ny2 = floatHebrewCalendarElapsedDays(year + 1)
+	if (ny2 - ny1) == 356:
+		delay = 2
+	elif (ny1 - ny0) == 382:
+		delay = 1
+	else:
+		delay = 0
+	return HEBREWEPOCH + ny1 + delay
+
+def floatLastDayOfHebrewMonth(year, month):
+	length = floatHebrewNewYear(year + 1) - floatHebrewNewYear(year)
+	if month in [2, 4, 6, 10, 13] or \
+		(month == 12 and not calendrical._isHebrewLeapYear(year)) or \
+		(month == 8 and not length in [355, 385]) or \
+		(month == 9 and length in [353, 383]):
+		return 29
+	else:
+		return 30
+
+def floatFixedFromHebrew(year, month, day):
+	if month < TISHRI:
+		ms = range(TISHRI, calendrical._lastMonthOfHebrewYear(year) + 1) + range(NISAN, month)
+	else:
+		ms = range(TISHRI, month)
+	return floatHebrewNewYear(year) + day - 1 + sum(map((lambda x: floatLastDayOfHebrewMonth(year, x)), ms))
+
+def floatHebrewFromFixed(date):
+	approx = int(math.floor((date - HEBREWEPOCH)/(35975351.0/98496))) + 1
+	y = approx - 1
+	while floatHebrewNewYear(y) <= date:
+		y = y + 1
+	year = int(y - 1)
+	if date < floatFixedFromHebrew(year, NISAN, 1):
+		start = TISHRI
+	else:
+		start = NISAN
+	m = start
+	while not date <= floatFixedFromHebrew(year, m, floatLastDayOfHebrewMonth(year, m)):
+		m = m + 1
+	month = m
+	day = date - floatFixedFromHebrew(year, month, 1) + 1
+	return [year, month, day]
+
+def days():
+	"""Every day of 1900-2100, and a sparse sample of years 1-9999"""
+	for d in xrange(calendrical.fixedFromGregorian(1900, 1, 1),
+	                calendrical.fixedFromGregorian(2100, 1, 1)):
+		yield d
+	for d in xrange(calendrical.fixedFromGregorian(1, 1, 1),
+	                calendrical.fixedFromGregorian(9999, 12, 31), 97):
+		yield d
+
+def check(name, got, expected, arg):
+	if got != expected:
+		raise AssertionError("%s(%r): got %r, expected %r" % (name, arg, got, expected))
+
+def test():
+	n = 0
+	for d in days():
+		g = calendrical.gregorianFromFixed(d)
+		check('gregorianFromFixed', g, floatGregorianFromFixed(d), d)
+		check('fixedFromGregorian', calendrical.fixedFromGregorian(*g), floatFixedFromGregorian(*g), g)
+		check('fixedFromGregorian', calendrical.fixedFromGregorian(*g), d, g)
+		check('gregorianYearFromFixed', calendrical.gregorianYearFromFixed(d), floatGregorianYearFromFixed(d), d)
+		h = calendrical.hebrewFromFixed(d)
+		check('hebrewFromFixed', h, floatHebrewFromFixed(d), d)
+		check('fixedFromHebrew', calendrical.fixedFromHebrew(*h), d, h)
+		n += 1
+	for year in xrange(1, 10000):
+		check('_hebrewCalendarElapsedDays', calendrical._hebrewCalendarElapsedDays(year),
+		      floatHebrewCalendarElapsedDays(year), year)
+		# Rosh Hashana is on the day of the molad of Tishri or is postponed
+		# by at most two days.
+		delay = calendrical._hebrewNewYear(year) - calendrical.molad(year, TISHRI)[0]
+		check('molad', delay in [0, 1, 2], True, year)
+	print "%d days checked, OK" % n
+
+def testDaysFromFixed():
+	"""Check the incremental date range against the scalar conversions"""
+	start = calendrical.fixedFromGregorian(1900, 1, 1)
+	end = calendrical.fixedFromGregorian(2100, 1, 1)
+	n = 0
+	for d, g, h, w in calendrical.daysFromFixed(start, end):
+		check('daysFromFixed', d, start + n, start)
+		check('daysFromFixed', g, calendrical.gregorianFromFixed(d), d)
+		check('daysFromFixed', h, calendrical.hebrewFromFixed(d), d)
+		check('daysFromFixed', w, calendrical.dayOfWeekFromFixed(d), d)
+		n += 1
+	check('daysFromFixed', n, end - start, start)
+	print "%d days of daysFromFixed() checked, OK" % n
+
+def testArrays():
+	"""Check the batch conversions against the scalar ones"""
+	if calendrical.numpy is None:
+		print "numpy not available, batch conversions not checked"
+		return
+	dates = list(days())
+	g = calendrical.gregorianFromFixedArray(dates)
+	h = calendrical.hebrewFromFixedArray(dates)
+	w = calendrical.dayOfWeekFromFixedArray(dates)
+	for i, d in enumerate(dates):
+		check('gregorianFromFixedArray', [g[0][i], g[1][i], g[2][i]], calendrical.gregorianFromFixed(d), d)
+		check('hebrewFromFixedArray', [h[0][i], h[1][i], h[2][i]], calendrical.hebrewFromFixed(d), d)
+		check('dayOfWeekFromFixedArray', w[i], calendrical.dayOfWeekFromFixed(d), d)
+	check('fixedFromGregorianArray', list(calendrical.fixedFromGregorianArray(*g)), dates, None)
+	check('fixedFromHebrewArray', list(calendrical.fixedFromHebrewArray(*h)), dates, None)
+	print "%d days checked against the batch conversions, OK" % len(dates)
+
+def bench(number=20000):
+	"""Time the integer conversions against the floating point ones"""
+	setup = "from __main__ import calendrical, floatFixedFromGregorian, " \
+	        "floatGregorianFromFixed, floatHebrewFromFixed; " \
+	        "date = calendrical.fixedFromGregorian(2012, 7, 29)"
+	for name, new, old in [
+		('fixedFromGregorian', 'calendrical.fixedFromGregorian(2012, 7, 29)',
+		                       'floatFixedFromGregorian(2012, 7, 29)'),
+		('gregorianFromFixed', 'calendrical.gregorianFromFixed(date)',
+		                       'floatGregorianFromFixed(date)'),
+		('hebrewFromFixed', 'calendrical.hebrewFromFixed(date)',
+		                    'floatHebrewFromFixed(date)')]:
+		tNew = min(timeit.Timer(new, setup).repeat(3, number))
+		tOld = min(timeit.Timer(old, setup).repeat(3, number))
+		print "%-20s %8.2f us  (float: %8.2f us, %.2fx)" % (
+			name, 1e6*tNew/number, 1e6*tOld/number, tOld/tNew)
+	setup = "import calendrical; dates = range(733042, 733042 + 3653)"
+	tScalar = min(timeit.Timer("[(d, calendrical.gregorianFromFixed(d), calendrical.hebrewFromFixed(d), "
+	                           "calendrical.dayOfWeekFromFixed(d)) for d in dates]", setup).repeat(3, 10))
+	tRange = min(timeit.Timer("list(calendrical.daysFromFixed(dates[0], dates[-1] + 1))", setup).repeat(3, 10))
+	print "%-20s %8.2f ms  (scalar: %8.2f ms, %.2fx) for ten years" % (
+		'daysFromFixed', 1e3*tRange/10, 1e3*tScalar/10, tScalar/tRange)
+	if calendrical.numpy is not None:
+		setup = "import calendrical; dates = range(733042, 733042 + 3653)"
+		tScalar = min(timeit.Timer("map(calendrical.hebrewFromFixed, dates)", setup).repeat(3, 10))
+		tBatch = min(timeit.Timer("calendrical.hebrewFromFixedArray(dates)", setup).repeat(3, 10))
+		print "%-20s %8.2f ms  (scalar: %8.2f ms, %.2fx) for ten years" % (
+			'hebrewFromFixedArray', 1e3*tBatch/10, 1e3*tScalar/10, tScalar/tBatch)
+
+if __name__ == '__main__':
+	if sys.argv[1:] == ['bench']:
+		bench()
+	else:
+		test()
+		testDaysFromFixed()
+		testArrays()
@@ -0,0 +1,472 @@
+#!/usr/bin/python
+# -*- Encoding: utf-8 -*-
+
+"""
+Test of the rendering of CondHtmlTextView without a display.
+
+The gtk, gobject and pango modules are replaced by fakes that keep the
+text of a buffer as a list of characters with their tags, and evaluate
+the properties of the tags by their priorities as gtk does. Run by doing
+
+    python test-condhtmlrender.py
+"""
+
+import os
+import sys
+import types
+
+# Fake gtk, gobject and pango
+
+class _Font(object):
+    def get_size(self):
+        return 10*1024
+
+    def to_string(self):
+        return "Sans 10"
+
+class _Attributes(object):
+    def __init__(self):
+        self.font = _Font()
+        self.font_scale = 1.0
+
+class TextTag(object):
+    """A tag whose properties are set or unset as in gtk: setting a
+    property sets its -set property, which may be cleared again"""
+    def __init__(self, table):
+        self.table = table
+        self.props = {}
+        self.set = {}
+
+    def set_property(self, name, value):
+        if name.endswith('-set'):
+            self.set[name[:-4]] = value
+        else:
+            self.props[name] = value
+            self.set[name] = True
+
+    def get_property(self, name):
+        if name.endswith('-set'):
+            return self.set.get(name[:-4], False)
+        return self.props.get(name)
+
+    def connect(self, *args):
+        pass
+
+    def get_priority(self):
+        return self.table.tags.index(self)
+
+    def settings(self):
+        """The properties that the tag sets"""
+        return tuple(sorted([(name, value) for name, value in self.props.items()
+                             if self.set.get(name)]))
+
+class TextTagTable(object):
+    def __init__(self):
+        self.tags = [] # by priority
+
+class TextIter(object):
+    def __init__(self, buffer, offset):
+        self.buffer = buffer
+        self.offset = offset
+
+    def copy(self):
+        return TextIter(self.buffer, self.offset)
+
+    def get_offset(self):
+        return self.offset
+
+    def starts_line(self):
+        return self.offset == 0 or self.buffer.chars[self.offset - 1][0] == '\n'
+
+    def backward_char(self):
+        self.offset = max(0, self.offset - 1)
+
+    def forward_char(self):
+        self.offset = min(len(self.buffer.chars), self.offset + 1)
+
+    def get_attributes(self, attrs):
+        return True
+
+    def backward_sentence_start(self):
+        if self.offset > 0:
+            self.offset -= 1
+        while self.offset > 0 and self.buffer.chars[self.offset - 1][0] not in '.\n':
+            self.offset -= 1
+
+    def set_line_offset(self, offset):
+        while self.offset > 0 and self.buffer.chars[self.offset - 1][0] != '\n':
+            self.offset -= 1
+        self.offset += offset
+
+class TextMark(object):
+    def __init__(self, offset):
+        self.offset = offset
+
+class TextBuffer(object):
+    def __init__(self, table=None):
+        if table is None:
+            table = TextTagTable()
+        self.table = table
+        self.chars = [] # [character, set of tags]
+
+    def get_tag_table(self):
+        return self.table
+
+    def create_tag(self):
+        tag = TextTag(self.table)
+        self.table.tags.append(tag)
+        return tag
+
+    def get_start_iter(self):
+        return TextIter(self, 0)
+
+    def get_end_iter(self):
+        return TextIter(self, len(self.chars))
+
+    def get_iter_at_offset(self, offset):
+        return TextIter(self, offset)
+
+    def get_bounds(self):
+        return self.get_start_iter(), self.get_end_iter()
+
+    def insert(self, iter, text):
+        self.insert_with_tags(iter, text)
+
+    def insert_with_tags(self, iter, text, *tags):
+        self.chars[iter.offset:iter.offset] = [[c, set(tags)] for c in text]
+        iter.offset += len(text)
+
+    def insert_range(self, iter, start, end):
+        chars = [[c, set(tags)] for c, tags in start.buffer.chars[start.offset:end.offset]]
+        self.chars[iter.offset:iter.offset] = chars
+        iter.offset += len(chars)
+
+    def apply_tag(self, tag, start, end):
+        for i in range(start.offset, end.offset):
+            self.chars[i][1].add(tag)
+
+    def create_mark(self, name, iter, left_gravity):
+        return TextMark(iter.offset)
+
+    def get_iter_at_mark(self, mark):
+        return TextIter(self, mark.offset)
+
+    def delete_mark(self, mark):
+        pass
+
+class _Rectangle(object):
+    x = y = 0
+    width = 400
+
+class TextView(object):
+    def __init__(self):
+        self.buffer = TextBuffer()
+        self.handlers = []
+
+    def get_buffer(self):
+        return self.buffer
+
+    def set_buffer(self, buffer):
+        self.buffer = buffer
+
+    def connect(self, name, callback, *args):
+        self.handlers.append((name, callback, args))
+
+    def emit(self, name, *args):
+        for handler, callback, extra in self.handlers:
+            if handler == name:
+                callback(self, *(args + extra))
+
+    def set_wrap_mode(self, mode):
+        pass
+
+    def set_editable(self, editable):
+        pass
+
+    def get_default_attributes(self):
+        return _Attributes()
+
+    def get_allocation(self):
+        return _Rectangle()
+
+    def get_visible_rect(self):
+        return _Rectangle()
+
+    def get_iter_at_location(self, x, y):
+        return self.buffer.get_start_iter()
+
+    def scroll_to_mark(self, mark, within_margin, use_align, xalign, yalign):
+        pass
+
+_idle = [] # the callbacks of idle_add(), None when removed
+
+def idle_add(callback, *args):
+    _idle.append((callback, args))
+    return len(_idle)
+
+def source_remove(source):
+    _idle[source - 1] = None
+
+def run_idle(max_calls=None):
+    """Run the idle callbacks until there are none, or max_calls of
+    them. Returns the number of calls."""
+    calls = 0
+    while calls != max_calls:
+        sources = [i for i in range(len(_idle)) if _idle[i] is not None]
+        if not sources:
+            return calls
+        callback, args = _idle[sources[0]]
+        calls += 1
+        if not callback(*args):
+            _idle[sources[0]] = None
+
+def _fake_modules():
+    gobject = types.ModuleType('gobject')
+    gobject.pygtk_version = (2, 16, 0)
+    gobject.SIGNAL_RUN_LAST = 1
+    gobject.type_register = lambda cls: None
+    gobject.idle_add = idle_add
+    gobject.source_remove = source_remove
+
+    pango = types.ModuleType('pango')
+    pango.SCALE = 1024
+    (pango.SCALE_XX_SMALL, pango.SCALE_X_SMALL, pango.SCALE_SMALL,
+     pango.SCALE_MEDIUM, pango.SCALE_LARGE, pango.SCALE_X_LARGE,
+     pango.SCALE_XX_LARGE) = (0.5787, 0.6944, 0.8333, 1.0, 1.2, 1.44, 1.728)
+    pango.STYLE_NORMAL, pango.STYLE_OBLIQUE, pango.STYLE_ITALIC = range(3)
+    (pango.WEIGHT_ULTRALIGHT, pango.WEIGHT_LIGHT, pango.WEIGHT_NORMAL,
+     pango.WEIGHT_BOLD, pango.WEIGHT_ULTRABOLD, pango.WEIGHT_HEAVY) = (200, 300, 400, 700, 800, 900)
+    pango.UNDERLINE_NONE, pango.UNDERLINE_SINGLE = range(2)
+
+    gtk = types.ModuleType('gtk')
+    gtk.gtk_version = (2, 14, 0)
+    gtk.WRAP_CHAR, gtk.WRAP_WORD = range(1, 3)
+    gtk.JUSTIFY_LEFT, gtk.JUSTIFY_RIGHT, gtk.JUSTIFY_CENTER, gtk.JUSTIFY_FILL = range(4)
+    gtk.TextView = TextView
+    gtk.TextBuffer = TextBuffer
+    gtk.gdk = types.ModuleType('gtk.gdk')
+    gtk.gdk.screen_height = lambda: 480
+    gtk.gdk.screen_height_mm = lambda: 50
+    gtk.gdk.color_parse = lambda color: ('color', color)
+    gtk.gdk.Color = lambda r, g, b: ('color', r, g, b)
+
+    sys.modules['gobject'] = gobject
+    sys.modules['pango'] = pango
+    sys.modules['gtk'] = gtk
+    sys.modules['hildon'] = None # an ImportError, see condhtmltextview
+
+_fake_modules()
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+import condhtmltextview
+
+# Tests
+
+def check(name, got, expected, arg):
+    if got != expected:
+        raise AssertionError("%s(%r): got %r, expected %r" % (name, arg, got, expected))
+
+def effective(tags):
+    """The properties of text with tags, with the tags of the higher
+    priority taking precedence"""
+    props = {}
+    for tag in sorted(tags, key=lambda tag: tag.table.tags.index(tag)):
+        props.update(tag.settings())
+    return props
+
+def visible_text(view):
+    return ''.join([c for c, tags in view.get_buffer().chars
+                    if not effective(tags).get('invisible')])
+
+def display(html, flags=''):
+    view = condhtmltextview.CondHtmlTextView()
+    view.set_flags(flags)
+    view.display_html(html)
+    run_idle()
+    return view
+
+def contents(view):
+    """The text of a view, with the properties of each tag of every
+    character and their effective properties"""
+    return [(c, sorted([tag.settings() for tag in tags]), sorted(effective(tags).items()))
+            for c, tags in view.get_buffer().chars]
+
+# Rendered in one pass, and in steps starting after first_screen_chars
+# with chunk_ops operations each
+CHUNKINGS = [(0, 1), (1, 3), (500, 20)]
+
+SAMPLE = """<body>
+<def name='red'><span style="color:red">red <span style="font-weight:bold">bold</span></span></def>
+<span style="font-size: 150%">Hello <cond flags='purim'>purim <span style="font-style:italic">
+ha<cond flags='shabbat'>shabbat</cond>ppy<p/>day</span><else/>weekday<p/><get name='red'/></cond>.
+<p/>
+<ul><li>one</li><li><a href='x'>link</a></li></ul><ol><li>first</li><li>second</li></ol>
+<div style="text-align:center">centered<br/>text</div>
+<cond flags='horef'>mashiv haruach<else/><cond flags='kaitz'>morid hatal</cond></cond>.
+<p/><insert name="insert.html"/><p/></span>
+</body>"""
+
+TEMPLATE = """
+    <body xmlns='http://www.w3.org/1999/xhtml'>
+    <span style="font-family:Frank Ruehl CLM; font-size: +150%%">%s
+    </span>
+    </body>
+    """
+
+def documents():
+    yield 'sample', SAMPLE
+    for filename in ['mincha.html', 'birkat.html']:
+        yield filename, TEMPLATE % open(filename).read()
+
+def render_once(docs, flags):
+    """The contents of a view into whose buffer the operations of each of
+    docs are rendered in a single pass, and with flags"""
+    view = condhtmltextview.CondHtmlTextView()
+    view.set_flags(flags)
+    buffer = view.get_buffer()
+    for ops in docs:
+        renderer = condhtmltextview.HtmlRenderer(view, buffer)
+        renderer.render(ops)
+        renderer.finish()
+    return contents(view)
+
+def new_view(flags, first_screen_chars, chunk_ops):
+    """A view that renders in steps of a single chunk"""
+    view = condhtmltextview.CondHtmlTextView()
+    view.first_screen_chars = first_screen_chars
+    view.chunk_ops = chunk_ops
+    view.chunk_time = 0
+    view.set_flags(flags)
+    return view
+
+def test_steps():
+    """Rendering in steps gives the text of rendering in one pass"""
+    inside = set()
+    def on_progress(view, fraction):
+        if view._rendering is not None:
+            renderer = view._rendering[0]
+            if renderer.cond_tags:
+                inside.add('cond')
+            if [tag for tag in renderer.styles if tag is not None]:
+                inside.add('span')
+    for name, html in documents():
+        ops = condhtmltextview.condhtmlir.compile_html(html)
+        expected = render_once([ops], 'purim|horef')
+        for first_screen_chars, chunk_ops in CHUNKINGS:
+            view = new_view('purim|horef', first_screen_chars, chunk_ops)
+            view.connect('render-progress', on_progress)
+            view.display_ops(ops)
+            steps = run_idle()
+            if len(ops) > first_screen_chars + chunk_ops:
+                check('steps', steps > 1, True, (name, first_screen_chars, chunk_ops))
+            check('display_ops', contents(view), expected, (name, first_screen_chars, chunk_ops))
+    check('chunk boundaries', sorted(inside), ['cond', 'span'], None)
+    print "Rendering in steps, OK"
+
+def test_displays():
+    """Displaying several documents, and changing the flags, while
+    rendering in steps, gives the text of rendering them in one pass
+    with the final flags"""
+    docs = [html for name, html in documents()]
+    expected = render_once([condhtmltextview.condhtmlir.compile_html(html) for html in docs],
+                           'shabbat|kaitz')
+    for first_screen_chars, chunk_ops in CHUNKINGS:
+        arg = (first_screen_chars, chunk_ops)
+        # A new display finishes the one that is still being rendered
+        view = new_view('purim', first_screen_chars, chunk_ops)
+        for html in docs:
+            view.display_html(html)
+            run_idle(2)
+        view.set_flags('shabbat|kaitz')
+        run_idle()
+        check('display_html', contents(view), expected, arg)
+        # The swapped in buffer keeps the documents displayed before
+        view = new_view('purim', first_screen_chars, chunk_ops)
+        for html in docs:
+            view.display_html(html)
+            run_idle()
+        view.set_flags('shabbat|kaitz')
+        check('display_html', contents(view), expected, arg)
+    print "Several displays, OK"
+
+def test_nested_conds():
+    """A shown cond in a hidden cond is hidden"""
+    html = ("<body>a<cond flags='x'>X<cond flags='b'>B</cond></cond>"
+            "c<cond flags='x'>Y<else/>Z<cond flags='b'>C</cond></cond></body>")
+    for flags, expected in [('', 'acZ\n'),
+                            ('b', 'acZC\n'),
+                            ('x', 'aXcY\n'),
+                            ('x|b', 'aXBcY\n')]:
+        check('display_html', visible_text(display(html, flags)), expected, flags)
+        # The same, by changing the flags of a displayed text
+        for initial in ['', 'b', 'x', 'x|b']:
+            view = display(html, initial)
+            view.set_flags(flags)
+            check('set_flags', visible_text(view), expected, (initial, flags))
+    print "Nested conds, OK"
+
+def test_nested_spans():
+    """The style of an inner span takes precedence over the enclosing
+    ones, also when its tag is shared with a span rendered earlier"""
+    view = display("<body><span style='color:red'>r<span style='color:blue'>b</span></span>"
+                   "<span style='color:blue'>B<span style='color:red'>R</span></span></body>")
+    colors = [(c, effective(tags).get('foreground-gdk'))
+              for c, tags in view.get_buffer().chars if c != '\n']
+    check('display_html', colors, [('r', ('color', 'red')), ('b', ('color', 'blue')),
+                                   ('B', ('color', 'blue')), ('R', ('color', 'red'))], None)
+    print "Nested spans, OK"
+
+def shown_ops(ops, flags):
+    """The operations without the text of the cond branches that are
+    hidden with flags"""
+    mask = condhtmltextview.condflags.flagMask(flags)
+    shown = [] # [cond mask, branch shown] of each open cond
+    result = []
+    for op in ops:
+        if op[0] == 'cond':
+            cond_mask = condhtmltextview.condflags.compileFlags(op[1])
+            shown.append([cond_mask, bool(mask & cond_mask)])
+        elif op[0] == 'else':
+            shown[-1][1] = not shown[-1][1]
+        elif op[0] == '/cond':
+            shown.pop()
+        elif op[0] in ('t', 'p', 'line', 'img') and [s for s in shown if not s[1]]:
+            continue
+        result.append(op)
+    return result
+
+# Documents with line breaks after cond branches, and the shown text
+# without flags
+LINES = [
+    ("<body>a<cond flags='x'>h<br/></cond><div>b</div></body>", 'a\nb\n'),
+    ("<body><div>a</div><cond flags='x'>h</cond><div>b</div></body>", 'a\nb\n'),
+    ("<body>a<br/><cond flags='x'>h</cond></body>", 'a\n'),
+    ("<body>a<cond flags='x'>h<br/><else/>e<cond flags='b'>i<br/></cond></cond>"
+     "<ul><li>l</li></ul><cond flags='b'>j</cond><div>k</div></body>", 'ae\n    \xe2\x80\xa2 l\nk\n'),
+    ]
+
+def test_line_breaks():
+    """The line breaks of div and lists depend only on the shown text"""
+    combinations = ['', 'x', 'b', 'x|b']
+    for html, expected in LINES:
+        check('display_html', visible_text(display(html)), expected.decode('utf-8'), html)
+        ops = condhtmltextview.condhtmlir.compile_html(html)
+        for flags in combinations:
+            view = condhtmltextview.CondHtmlTextView()
+            view.set_flags(flags)
+            renderer = condhtmltextview.HtmlRenderer(view, view.get_buffer())
+            renderer.render(shown_ops(ops, flags))
+            renderer.finish()
+            expected = visible_text(view)
+            check('display_html', visible_text(display(html, flags)), expected, (html, flags))
+            for initial in combinations:
+                view = display(html, initial)
+                view.set_flags(flags)
+                check('set_flags', visible_text(view), expected, (html, initial, flags))
+    print "Line breaks after conds, OK"
+
+if __name__ == '__main__':
+    test_nested_conds()
+    test_line_breaks()
+    test_nested_spans()
+    test_steps()
+    test_displays()
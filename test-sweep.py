@@ -0,0 +1,230 @@
+#!/usr/bin/python
+# -*- Encoding: utf-8 -*-
+
+"""
+Regression sweep of every day of several centuries.
+
+For every day the Hebrew, Gregorian and ISO conversions of calendrical
+are checked to round trip, and the flags of JHolidays.getCalendarFlags()
+are compared, for Israel and for the diaspora, against a golden flag
+table written by an earlier, trusted, revision. The years are checked in
+parallel by a pool of processes. Check the code by doing
+
+    python test-sweep.py [-j processes] [first year [number of years]]
+
+The default is the 500 Hebrew years from 5560, i.e. 1799-2300. The
+throughput and the first diverging day, if any, are reported, and the
+exit status is 1 on a divergence or if there is no golden table.
+
+The golden table golden-flags.gz holds the flags that the original
+JHolidays.py and calendrical.py computed for the default years. It is
+written from a checkout of the trusted revision, e.g.
+
+    git archive REVISION JHolidays.py calendrical.py | tar -x -C /tmp/trusted
+    python test-sweep.py --write-golden /tmp/trusted
+
+Only the flags that the trusted revision computes are compared, and the
+days on which it fails are not compared at all. The original failed on
+Yom Hazikaron and Yom Haatzmaut. The table is gzipped text, with a line
+"fixed day, flags in Israel, flags in the diaspora" for every day whose
+flags differ from those of the day before, '-' for no flags and '?' for
+a failure.
+"""
+
+import os
+import sys
+import gzip
+import time
+import bisect
+import datetime
+import optparse
+import multiprocessing
+import calendrical
+import JHolidays
+
+GOLDENFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden-flags.gz')
+
+# Flags renamed since the trusted revision
+RENAMES = {'Omer': 'omer', 'hanukka': 'hannuka'}
+
+class GoldenFlags(object):
+	"""The flags of a golden table, see the module documentation"""
+
+	def __init__(self, filename):
+		self.days = []
+		self.flags = []
+		self.checked = set()
+		self.first = self.count = None
+		f = gzip.open(filename)
+		try:
+			for line in f:
+				fields = line.split()
+				if not fields or fields[0] == '#':
+					continue
+				if fields[0] == 'years':
+					self.first, self.count = int(fields[1]), int(fields[2])
+					continue
+				self.days.append(int(fields[0]))
+				self.flags.append(tuple([self._parse(field) for field in fields[1:3]]))
+		finally:
+			f.close()
+		self.start = calendrical.hebrewYearInfo(self.first).newYear
+		self.end = calendrical.hebrewYearInfo(self.first + self.count).newYear
+
+	def _parse(self, field):
+		if field == '?':
+			return None
+		if field == '-':
+			return frozenset()
+		flags = frozenset([RENAMES.get(name, name) for name in field.split('|')])
+		self.checked.update(flags)
+		return flags
+
+	def getFlags(self, fixed, isDiaspora):
+		"""The set of flags of a fixed day, None if it is not compared, or
+		False if it is not in the table"""
+		if fixed < self.start or fixed >= self.end:
+			return False
+		return self.flags[bisect.bisect_right(self.days, fixed) - 1][bool(isDiaspora)]
+
+def writeGolden(filename, trustedDir, first, count):
+	"""Write the golden table of the JHolidays.py and calendrical.py in
+	trustedDir. Returns the number of days on which they fail."""
+	trusted = _importTrusted(trustedDir)
+	failures = 0
+	f = gzip.open(filename, 'wb')
+	try:
+		f.write("# Golden calendar flags of test-sweep.py\n")
+		f.write("years %d %d\n" % (first, count))
+		last = None
+		for d in xrange(calendrical.hebrewYearInfo(first).newYear,
+		                calendrical.hebrewYearInfo(first + count).newYear):
+			date = datetime.date(*calendrical.gregorianFromFixed(d))
+			fields = []
+			for isDiaspora in (False, True):
+				try:
+					flags = str(trusted.getCalendarFlags(date, isDiaspora, False)) or '-'
+				except Exception:
+					flags = '?'
+					failures += 1
+				fields.append(flags)
+			if fields != last:
+				f.write("%d %s %s\n" % (d, fields[0], fields[1]))
+				last = fields
+	finally:
+		f.close()
+	return failures
+
+def _importTrusted(directory):
+	"""Import the JHolidays of directory, with the modules it imports from
+	there, without replacing the modules of this revision"""
+	names = ['calendrical', 'condflags', 'parasha', 'JHolidays']
+	saved = {}
+	for name in names:
+		if name in sys.modules:
+			saved[name] = sys.modules.pop(name)
+	sys.path.insert(0, os.path.abspath(directory))
+	try:
+		return __import__('JHolidays')
+	finally:
+		del sys.path[0]
+		for name in names:
+			sys.modules.pop(name, None)
+		sys.modules.update(saved)
+
+# The golden table of a worker process
+_golden = None
+
+def _init(goldenFile):
+	global _golden
+	_golden = GoldenFlags(goldenFile)
+
+def checkYear(hebYear):
+	"""Check every day of a Hebrew year. Returns the number of days
+	checked and the first divergence as (fixed day, description), or
+	None."""
+	info = calendrical.hebrewYearInfo(hebYear)
+	for d in xrange(info.newYear, info.newYear + info.length):
+		h = calendrical.hebrewFromFixed(d)
+		if calendrical.fixedFromHebrew(*h) != d:
+			return info.length, (d, "fixedFromHebrew(*hebrewFromFixed(%d)) = %d" % (d, calendrical.fixedFromHebrew(*h)))
+		g = calendrical.gregorianFromFixed(d)
+		if calendrical.fixedFromGregorian(*g) != d:
+			return info.length, (d, "fixedFromGregorian(*gregorianFromFixed(%d)) = %d" % (d, calendrical.fixedFromGregorian(*g)))
+		iso = calendrical.isoFromFixed(d)
+		if calendrical.fixedFromIso(*iso) != d:
+			return info.length, (d, "fixedFromIso(*isoFromFixed(%d)) = %d" % (d, calendrical.fixedFromIso(*iso)))
+		day = calendrical.HDate(d)
+		for isDiaspora in (False, True):
+			expected = _golden.getFlags(d, isDiaspora)
+			if expected is False:
+				return info.length, (d, "not in the golden table")
+			if expected is None:
+				continue
+			got = _golden.checked.intersection(
+				JHolidays.getCalendarFlags(day, isDiaspora, False).names())
+			if got != expected:
+				return info.length, (d, "getCalendarFlags(%r, %s): got %s, expected %s" % (
+					day, isDiaspora, "|".join(sorted(got)), "|".join(sorted(expected))))
+	return info.length, None
+
+def sweep(years, goldenFile, processes=None):
+	"""Check years in parallel. Returns the number of days checked, the
+	time it took and the first divergence, see checkYear()."""
+	start = time.time()
+	if processes == 1:
+		_init(goldenFile)
+		results = map(checkYear, years)
+	else:
+		pool = multiprocessing.Pool(processes, _init, (goldenFile,))
+		results = pool.imap(checkYear, years, 8)
+	days = 0
+	divergence = None
+	for n, failure in results:
+		days += n
+		if failure and not divergence:
+			divergence = failure
+	if processes != 1:
+		pool.close()
+		pool.join()
+	return days, time.time() - start, divergence
+
+def main():
+	parser = optparse.OptionParser(usage="%prog [options] [first year [number of years]]")
+	parser.add_option('-g', '--golden', default=GOLDENFILE, metavar="FILE",
+	                  help="golden flag table [default: %default]")
+	parser.add_option('-w', '--write-golden', metavar="DIR",
+	                  help="write the golden flag table of the years from the trusted "
+	                  "JHolidays.py and calendrical.py in DIR and exit")
+	parser.add_option('-j', '--processes', type='int',
+	                  help="number of processes [default: number of CPUs]")
+	options, args = parser.parse_args()
+	first = 5560
+	count = 500
+	if len(args) > 0:
+		first = int(args[0])
+	if len(args) > 1:
+		count = int(args[1])
+
+	if options.write_golden:
+		failures = writeGolden(options.golden, options.write_golden, first, count)
+		print "Wrote the golden flags of Hebrew years %d-%d to %s, %d failures not compared" % (
+			first, first + count - 1, options.golden, failures)
+		return 0
+
+	if not os.path.exists(options.golden):
+		print "No golden table %s" % options.golden
+		return 1
+	days, elapsed, divergence = sweep(range(first, first + count), options.golden,
+	                                  options.processes)
+	print "Checked %d days of Hebrew years %d-%d in %.1f s, %.0f days/s" % (
+		days, first, first + count - 1, elapsed, days/elapsed)
+	if divergence:
+		d, description = divergence
+		print "First divergence on %s (%s): %s" % (
+			calendrical.HDate(d).toDate(), d, description)
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
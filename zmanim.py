@@ -0,0 +1,178 @@
+"""
+zmanim.py is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+zmanim.py is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Sunrise, sunset and nightfall (tzeit hakochavim) for a location.
+
+The times are calculated with the NOAA approximation of the solar
+position, which is accurate to a minute or two away from the polar
+regions. A whole Gregorian year is calculated in one pass, with numpy
+when it is available, and cached on disk per location, so that finding
+out whether it is after sunset is a table lookup.
+
+All times are in minutes since midnight UTC of the date, and latitude
+and longitude are in degrees, positive to the north and to the east.
+
+Example:
+>>> sunrise, sunset, tzeit = getZmanim(datetime.date(2012, 7, 29), 31.78, 35.22)
+>>> '%02d:%02d' % divmod(sunset, 60)
+'16:39'
+"""
+import os
+import math
+import time
+import array
+import datetime
+import calendar
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# Zenith angles of the sun in degrees. Sunrise and sunset include the
+# refraction and the radius of the sun, tzeit is when three medium stars
+# are visible, 8.5 degrees below the horizon.
+SUNRISE_ZENITH = 90.833
+TZEIT_ZENITH = 98.5
+
+# Table value of a day on which the sun does not cross the zenith angle
+NONE = -32768
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.MaemoSiddur', 'zmanim')
+
+def _solarEvents(m, dayOfYear, daysInYear, latitude, longitude, zenith):
+  """Solar position for a day of the year or an array of days, using
+  math or numpy as m. Returns the cos of the hour angle at which the sun
+  is at the zenith angle, which is out of [-1, 1] if it never is, and
+  the time of solar noon."""
+  gamma = 2*math.pi/daysInYear*(dayOfYear - 1)
+  eqtime = 229.18*(0.000075 + 0.001868*m.cos(gamma) - 0.032077*m.sin(gamma)
+                   - 0.014615*m.cos(2*gamma) - 0.040849*m.sin(2*gamma))
+  decl = (0.006918 - 0.399912*m.cos(gamma) + 0.070257*m.sin(gamma)
+          - 0.006758*m.cos(2*gamma) + 0.000907*m.sin(2*gamma)
+          - 0.002697*m.cos(3*gamma) + 0.00148*m.sin(3*gamma))
+  lat = math.radians(latitude)
+  cosHa = (math.cos(math.radians(zenith))/(math.cos(lat)*m.cos(decl))
+           - math.tan(lat)*m.tan(decl))
+  return cosHa, 720 - 4*longitude - eqtime
+
+def _yearTable(year, latitude, longitude):
+  """Sunrise, sunset and tzeit of every day of a Gregorian year as an
+  array('h') of three consecutive runs of days"""
+  daysInYear = 365 + calendar.isleap(year)
+  table = array.array('h')
+  for zenith, sign in [(SUNRISE_ZENITH, -1), (SUNRISE_ZENITH, 1), (TZEIT_ZENITH, 1)]:
+    if numpy is not None:
+      days = numpy.arange(1, daysInYear + 1)
+      cosHa, noon = _solarEvents(numpy, days, daysInYear, latitude, longitude, zenith)
+      ha = numpy.degrees(numpy.arccos(numpy.clip(cosHa, -1, 1)))
+      minutes = numpy.where(abs(cosHa) <= 1, numpy.round(noon + sign*4*ha), NONE)
+      table.extend(minutes.astype(int).tolist())
+    else:
+      for day in range(1, daysInYear + 1):
+        cosHa, noon = _solarEvents(math, day, daysInYear, latitude, longitude, zenith)
+        if abs(cosHa) <= 1:
+          table.append(int(round(noon + sign*4*math.degrees(math.acos(cosHa)))))
+        else:
+          table.append(NONE)
+  return table
+
+def _cacheFile(year, latitude, longitude):
+  return os.path.join(CACHE_DIR, '%+08.3f%+09.3f-%d.dat' % (latitude, longitude, year))
+
+_tables = {}
+
+def getYearTable(year, latitude, longitude):
+  """Cached sunrise, sunset and tzeit table of a Gregorian year, see
+  _yearTable(). The table is read from the disk cache when possible,
+  and calculated and written to it otherwise."""
+  key = (year, latitude, longitude)
+  table = _tables.get(key)
+  if table is not None:
+    return table
+
+  daysInYear = 365 + calendar.isleap(year)
+  filename = _cacheFile(year, latitude, longitude)
+  table = array.array('h')
+  try:
+    f = open(filename, 'rb')
+    try:
+      table.fromfile(f, 3*daysInYear)
+    finally:
+      f.close()
+  except (IOError, EOFError):
+    table = _yearTable(year, latitude, longitude)
+    try:
+      if not os.path.isdir(CACHE_DIR):
+        os.makedirs(CACHE_DIR)
+      f = open(filename, 'wb')
+      try:
+        table.tofile(f)
+      finally:
+        f.close()
+    except (IOError, OSError):
+      pass # The cache is only an optimization
+  _tables[key] = table
+  return table
+
+def getZmanim(date, latitude, longitude):
+  """Sunrise, sunset and tzeit of a datetime.date, in minutes since
+  midnight UTC of the date, or NONE if there is no such time that day"""
+  table = getYearTable(date.year, latitude, longitude)
+  daysInYear = len(table)//3
+  i = date.timetuple().tm_yday - 1
+  return table[i], table[daysInYear + i], table[2*daysInYear + i]
+
+def getNightFall(date, latitude, longitude, useTzeit=False):
+  """Sunset (or tzeit) of a datetime.date in seconds since the epoch,
+  or None if the sun does not set that day"""
+  sunrise, sunset, tzeit = getZmanim(date, latitude, longitude)
+  if useTzeit:
+    sunset = tzeit
+  if sunset == NONE:
+    return None
+  return calendar.timegm(date.timetuple()) + 60*sunset
+
+def isNightFall(latitude, longitude, now=None, useTzeit=False):
+  """True if it is after sunset (or tzeit) of the local date.
+
+  Arguments:
+  latitude, longitude - location
+  now - seconds since the epoch, default the current time
+  useTzeit - compare against tzeit instead of sunset
+  """
+  if now is None:
+    now = time.time()
+  date = datetime.date(*time.localtime(now)[:3])
+  nightFall = getNightFall(date, latitude, longitude, useTzeit)
+  return nightFall is not None and now >= nightFall
+
+def getNextTransition(latitude, longitude, now=None, useTzeit=False):
+  """The time, in seconds since the epoch, at which isNightFall() or
+  the local date next changes: the coming nightfall, or else the coming
+  local midnight"""
+  if now is None:
+    now = time.time()
+  date = datetime.date(*time.localtime(now)[:3])
+  nightFall = getNightFall(date, latitude, longitude, useTzeit)
+  if nightFall is not None and now < nightFall:
+    return nightFall
+  return time.mktime((date + datetime.timedelta(1)).timetuple())
+
+# test functions
+def _test():
+  import doctest
+  doctest.testmod()
+
+if __name__ == "__main__":
+  _test()